@@ -0,0 +1,128 @@
+import asyncio
+import functools
+import os
+import weakref
+import xml.etree.ElementTree as ET
+
+import syllabize
+
+def _read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _write_bytes(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _write_lines(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+def _process_lines(lines, options):
+    return syllabize.map_lines([line.strip() for line in lines], **options)
+
+def _parse_beats(content):
+    try:
+        return syllabize.beats_from_beatmap(ET.fromstring(content))
+    except Exception as e:
+        print(f"Error parsing beatmap: {e}")
+        return []
+
+def _build_rocksmith_xml(data, offset, beats, empty_measure):
+    tree = syllabize.build_rocksmith_tree(data, offset, beats, empty_measure)
+    return ET.tostring(tree.getroot(), encoding='utf-8', xml_declaration=True)
+
+class AsyncLyridan:
+    """
+    asyncio front end for syllabize. File I/O runs on io_executor (default: the
+    loop's thread pool) and CPU work on executor, which can be a
+    ProcessPoolExecutor (e.g. with initializer=syllabize.warm_up) to use every core.
+    At most max_concurrency calls run at once; further callers wait their turn.
+    """
+    def __init__(self, executor=None, max_concurrency=None, io_executor=None):
+        self.executor = executor
+        self.io_executor = io_executor
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def _io(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, functools.partial(func, *args))
+
+    async def _cpu(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def aprocess_file(self, input_path, output_path=None, separator="+", romanize=False,
+                            capitalize=False, language_override=None):
+        """Syllabizes an .lrc file, returns the processed lines and writes them to output_path if given"""
+        options = {'separator': separator, 'romanize': romanize,
+                   'capitalize': capitalize, 'language_override': language_override}
+        async with self.slots:
+            lines, info = await self._io(syllabize.read_lrc_file, input_path)
+            processed_lines = await self._cpu(_process_lines, lines, options)
+            if output_path:
+                await self._io(_write_lines, output_path, processed_lines)
+            return processed_lines
+
+    async def aextract_ttml(self, file_path, track=None):
+        """Async extract_ttml_data"""
+        async with self.slots:
+            try:
+                content = await self._io(_read_text, file_path)
+            except Exception as e:
+                print(f"Error extracting TTML data: {e}")
+                return []
+            return await self._cpu(syllabize.extract_ttml_data_from_text, content, track)
+
+    async def aindex_ttml(self, file_path):
+        """Async index_ttml: every track of the file, to pick from without reparsing"""
+        async with self.slots:
+            try:
+                content = await self._io(_read_text, file_path)
+                return await self._cpu(syllabize.index_ttml_text, content)
+            except Exception as e:
+                print(f"Error indexing TTML data: {e}")
+                return None
+
+    async def aexport_rocksmith(self, data, output_path, offset=10.0, beatmap_path=None, empty_measure=False):
+        """Async export_rocksmith_xml"""
+        async with self.slots:
+            beats = []
+            if beatmap_path:
+                try:
+                    beats = await self._cpu(_parse_beats, await self._io(_read_bytes, beatmap_path))
+                except Exception as e:
+                    print(f"Error parsing beatmap: {e}")
+            xml_bytes = await self._cpu(_build_rocksmith_xml, data, offset, beats, empty_measure)
+            try:
+                await self._io(_write_bytes, output_path, xml_bytes)
+                return True
+            except Exception as e:
+                print(f"Error writing XML: {e}")
+                return False
+
+# One default instance per event loop, since asyncio semaphores belong to a single loop
+_defaults = weakref.WeakKeyDictionary()
+
+def _get_default():
+    loop = asyncio.get_running_loop()
+    if loop not in _defaults:
+        _defaults[loop] = AsyncLyridan()
+    return _defaults[loop]
+
+async def aprocess_file(input_path, output_path=None, **options):
+    return await _get_default().aprocess_file(input_path, output_path, **options)
+
+async def aextract_ttml(file_path, track=None):
+    return await _get_default().aextract_ttml(file_path, track)
+
+async def aindex_ttml(file_path):
+    return await _get_default().aindex_ttml(file_path)
+
+async def aexport_rocksmith(data, output_path, offset=10.0, beatmap_path=None, empty_measure=False):
+    return await _get_default().aexport_rocksmith(data, output_path, offset, beatmap_path, empty_measure)
@@ -0,0 +1,215 @@
+import argparse
+import contextlib
+import json
+import os
+
+import exporters
+import syllabize
+
+READ_SIZE = 1 << 20
+NUMBER_CHARS = '0123456789.eE+-'
+
+class BundleReader:
+    """
+    Walks the "data" array of an Apple Music lyrics JSON file one entry at a time.
+    Only the entry being decoded is held in memory, so bundles with thousands of
+    songs can be read in constant space.
+    """
+    def __init__(self, f, read_size=READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Reads more input, dropping the consumed part of the buffer. Returns False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return
+
+    def _expect(self, chars):
+        """Consumes and returns the next non-whitespace character, which must be one of chars"""
+        self._skip_whitespace()
+        if self.pos >= len(self.buffer):
+            raise ValueError("Unexpected end of JSON bundle")
+        char = self.buffer[self.pos]
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def _decode_value(self):
+        """Decodes the next JSON value, reading more input until it is complete"""
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut off by the end of the buffer may continue in the next chunk
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                pass
+            if not self._fill():
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+
+    def entries(self):
+        """Yields each element of the top-level "data" array; other top-level keys are skipped"""
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._decode_value()
+            self._expect(':')
+            if key == 'data':
+                self._expect('[')
+                if self._peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield self._decode_value()
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                self._decode_value()
+            if self._expect(',}') == '}':
+                return
+
+    def _peek(self):
+        self._skip_whitespace()
+        return self.buffer[self.pos] if self.pos < len(self.buffer) else ''
+
+def entry_ttml(entry):
+    """Returns the TTML document embedded in one bundle entry, or None"""
+    try:
+        attributes = entry['attributes']
+    except (KeyError, TypeError):
+        return None
+    return attributes.get('ttmlLocalizations') or attributes.get('ttml')
+
+def iter_bundle(file_path):
+    """
+    Yields (song_id, spans) for every song in an Apple Music JSON bundle, where spans is
+    the extract_ttml_data list for that song. Entries without TTML are skipped with a warning.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for index, entry in enumerate(BundleReader(f).entries()):
+            song_id = str(entry.get('id', index)) if isinstance(entry, dict) else str(index)
+            ttml = entry_ttml(entry)
+            if not ttml:
+                print(f"Warning: no TTML found for song {song_id}")
+                continue
+            yield song_id, syllabize.extract_ttml_data_from_text(ttml)
+
+def export_bundle(file_path, output_dir, formats, **options):
+    """
+    Exports every song in a bundle to output_dir as <song_id>.<ext> for each format
+    ('lrc', 'enhanced_lrc', 'ultrastar', 'rocksmith', 'json'), one song at a time.
+    Returns (exported, failed) counts.
+    """
+    extensions = {
+        'lrc': '.lrc',
+        'enhanced_lrc': '.enhanced.lrc',
+        'ultrastar': '.txt',
+        'rocksmith': '_rs.xml',
+        'json': '.json',
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    exported = failed = 0
+    for song_id, spans in iter_bundle(file_path):
+        if not spans:
+            print(f"No lyrics found for song {song_id}")
+            failed += 1
+            continue
+        outputs = {fmt: os.path.join(output_dir, song_id + extensions[fmt]) for fmt in formats}
+        if exporters.export_song(spans, outputs, title=song_id, **options):
+            exported += 1
+        else:
+            failed += 1
+    return exported, failed
+
+def export_bundle_records(file_path, outputs):
+    """
+    Writes the per-syllable records (see exporters.syllable_records) of every song in a
+    bundle into one output per format, so a whole catalog can be loaded at once.
+    outputs maps a format in exporters.RECORD_FORMATS to its path. Returns (exported, failed) counts.
+    """
+    exported = failed = 0
+    with contextlib.ExitStack() as stack:
+        writers = []
+        for fmt, path in outputs.items():
+            if fmt == 'jsonl':
+                writers.append(exporters.SyllableJSONLWriter(stack.enter_context(exporters.atomic_open(path))))
+            else:
+                writers.append(exporters.ColumnarWriter(path, fmt))
+
+        for writer in writers:
+            writer.begin()
+        for song_id, spans in iter_bundle(file_path):
+            if not spans:
+                print(f"No lyrics found for song {song_id}")
+                failed += 1
+                continue
+            for writer in writers:
+                writer.start_song(song_id)
+            for line in exporters.iter_song_lines(spans):
+                for writer in writers:
+                    writer.write_line(line)
+            exported += 1
+        for writer in writers:
+            writer.end()
+    return exported, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert every song in an Apple Music JSON bundle.")
+    parser.add_argument('input', help="JSON file with a \"data\" array of songs")
+    parser.add_argument('-o', '--output-dir', default='.', help="directory for the exported files")
+    parser.add_argument('--lrc', action='store_true', help="syllabized LRC")
+    parser.add_argument('--enhanced-lrc', action='store_true', help="word-timed (enhanced) LRC")
+    parser.add_argument('--ultrastar', action='store_true', help="UltraStar TXT")
+    parser.add_argument('--rocksmith', action='store_true', help="Rocksmith vocals XML")
+    parser.add_argument('--json', action='store_true', help="timed syllable JSON")
+    parser.add_argument('-s', '--separator', default='+', help="syllable separator for the LRC output")
+    parser.add_argument('--per-syllable', action='store_true', help="time every syllable in the enhanced LRC output")
+    parser.add_argument('--offset', type=float, default=10.0, help="Rocksmith time offset in seconds")
+    parser.add_argument('--jsonl', metavar='PATH', help="per-syllable records of every song in one JSON Lines file")
+    parser.add_argument('--columns', metavar='PATH', help="per-syllable records of every song in one columnar .lyc file")
+    parser.add_argument('--npy', metavar='DIR', help="per-syllable records of every song as one .npy file per column (needs numpy)")
+    parser.add_argument('--parquet', metavar='PATH', help="per-syllable records of every song in one Parquet file (needs pyarrow)")
+    args = parser.parse_args()
+
+    formats = [fmt for fmt in ('lrc', 'enhanced_lrc', 'ultrastar', 'rocksmith', 'json') if getattr(args, fmt)]
+    record_outputs = {fmt: getattr(args, fmt) for fmt in exporters.RECORD_FORMATS if getattr(args, fmt)}
+    if not formats and not record_outputs:
+        parser.error("choose at least one of --lrc, --enhanced-lrc, --ultrastar, --rocksmith, --json, "
+                     "--jsonl, --columns, --npy, --parquet")
+
+    if formats:
+        exported, failed = export_bundle(args.input, args.output_dir, formats, separator=args.separator,
+                                         offset=args.offset, per_syllable=args.per_syllable)
+        print(f"Exported {exported} songs, {failed} failed")
+    if record_outputs:
+        try:
+            exported, failed = export_bundle_records(args.input, record_outputs)
+            print(f"Wrote the syllables of {exported} songs to {', '.join(record_outputs.values())}, {failed} failed")
+        except Exception as e:
+            print(f"Error exporting syllables: {e}")
+
+if __name__ == "__main__":
+    main()
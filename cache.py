@@ -0,0 +1,213 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import syllabize
+
+# Lines looked up per SQL statement (stays under SQLite's bound variable limit)
+BATCH_SIZE = 500
+# Batches shorter than this are processed directly: a cache round trip (hashing the
+# lines and the SQLite reads and commit) costs more than processing a few lines
+MIN_CACHED_LINES = 32
+
+class ResultCache:
+    """
+    Persistent cache of processed lyrics, stored in a single SQLite file.
+    Entries are evicted least recently used first once the total size of the
+    stored values goes over max_size bytes. One instance can be shared between threads,
+    and several processes can share the file: the total size is read from the database
+    in the same transaction as the writes it is checked against.
+    """
+    def __init__(self, path, max_size=64 * 1024 * 1024):
+        self.path = str(path)
+        self.max_size = max_size
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # It is only a cache, so trade durability for cheap commits on every lookup
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.conn.commit()
+
+    @property
+    def total_size(self):
+        """Total size of the stored keys and values in bytes"""
+        with self.lock:
+            return self._total_size()
+
+    def _total_size(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Returns {key: value} for the keys that are cached and marks them as used"""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        with self.lock:
+            self._get_many(keys, found)
+        return found
+
+    def _get_many(self, keys, found):
+        for i in range(0, len(keys), BATCH_SIZE):
+            batch = keys[i:i + BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(f"SELECT key, value FROM entries WHERE key IN ({placeholders})", batch)
+            found.update(rows)
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            self.conn.commit()
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def put_many(self, items):
+        if not items:
+            return
+        with self.lock:
+            self._put_many(items)
+
+    def _put_many(self, items):
+        now = time.time()
+        rows = [(key, value, len(key) + len(value.encode('utf-8')), now) for key, value in items.items()]
+        try:
+            # The insert starts the write transaction, so no other process can change
+            # the total between reading it and evicting
+            self.conn.executemany("INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)", rows)
+            total_size = self._total_size()
+            if total_size > self.max_size:
+                self._evict(total_size)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def evict(self):
+        """Drops least recently used entries until the cache is under 90% of its cap"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._evict(self._total_size())
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def _evict(self, total_size):
+        """Deletes entries inside the current write transaction, given the total size read in it"""
+        target = self.max_size * 0.9
+        while total_size > target:
+            rows = self.conn.execute("SELECT key, size FROM entries ORDER BY last_used LIMIT ?", (BATCH_SIZE,)).fetchall()
+            if not rows:
+                break
+            doomed = []
+            for key, size in rows:
+                doomed.append((key,))
+                total_size -= size
+                if total_size <= target:
+                    break
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def open_default_cache(config):
+    """Opens the cache in the config directory, or returns None if it is disabled"""
+    if not config.get('cache.enabled', True):
+        return None
+    max_size = int(config.get('cache.max_size_mb', 64) * 1024 * 1024)
+    try:
+        return ResultCache(config.config_dir / 'cache.db', max_size)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not open result cache: {e}")
+        return None
+
+def _hash(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def options_key(separator, romanize, capitalize, language_override):
+    return json.dumps([separator, bool(romanize), bool(capitalize), language_override])
+
+def dictionary_fingerprint(line, english_dict=None):
+    """
+    Hashes the English dictionary entries a line could look up, so a line only
+    misses the cache when an entry it actually uses was edited. english_dict is the
+    dictionary to hash entries from (default: syllabize.get_english_dict()).
+    """
+    match = syllabize.LRC_LINE_RE.match(line)
+    if not match:
+        return ''
+    if english_dict is None:
+        english_dict = syllabize.get_english_dict()
+    entries = []
+    for word in match.group(2).split():
+        core = syllabize.strip_punctuation(word)[1].lower()
+        entries.append(english_dict.get(core, ''))
+    return _hash(*entries)
+
+def process_lines(lines, cache=None, separator="+", romanize=False, capitalize=False, language_override=None, pool=None):
+    """
+    Runs process_line over lines, reusing cached results where possible.
+    The whole file is looked up first (keyed on its content, the options and the
+    dictionary/romanizer versions); on a miss each line is looked up on its own,
+    keyed on the dictionary entries it uses, and only the misses are recomputed.
+    Misses are computed on the given WorkerPool if there is one.
+    """
+    options = {'separator': separator, 'romanize': romanize,
+               'capitalize': capitalize, 'language_override': language_override}
+
+    def compute(todo):
+        if pool is not None and len(todo) > 1:
+            return pool.map_lines(todo, **options)
+        return syllabize.map_lines(todo, **options)
+
+    if cache is None or len(lines) < MIN_CACHED_LINES:
+        return compute(lines)
+
+    options_id = options_key(separator, romanize, capitalize, language_override)
+    romanizer = syllabize.romanizer_version()
+    file_key = 'file:' + _hash('\n'.join(lines), options_id, syllabize.get_english_dict_version(), romanizer)
+
+    try:
+        cached = cache.get(file_key)
+        if cached is not None:
+            return json.loads(cached)
+
+        english_dict = syllabize.get_english_dict()
+        line_keys = ['line:' + _hash(line, options_id, dictionary_fingerprint(line, english_dict), romanizer)
+                     for line in lines]
+        found = cache.get_many(line_keys)
+        todo = {}
+        for line, key in zip(lines, line_keys):
+            if key not in found and key not in todo:
+                todo[key] = line
+        computed = dict(zip(todo, compute(list(todo.values()))))
+        found.update(computed)
+        results = [found[key] for key in line_keys]
+
+        computed[file_key] = json.dumps(results, ensure_ascii=False)
+        cache.put_many(computed)
+        return results
+    except sqlite3.Error as e:
+        print(f"Warning: Result cache unavailable: {e}")
+        return compute(lines)
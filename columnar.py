@@ -0,0 +1,189 @@
+"""
+Column-oriented storage of per-syllable records (see exporters.syllable_records), so
+analytics tools can bulk-load timed syllables instead of parsing display text.
+
+The .lyc file format, with every number little-endian:
+    the magic b'LYRCOL1\\0' and a uint32 header size, then the header: UTF-8 JSON
+    {"rows": n, "columns": [{"name", "type", "offset", "size", ...}, ...]}.
+    The data area starts at the first 8-byte boundary after the header. Each column is
+    size bytes at offset into the data area (8-byte aligned): n float64 or int32 values,
+    or for "string" columns n int32 codes into the column's distinct values. Those are
+    stored at values_offset as value_count + 1 uint32 offsets followed by their UTF-8 text.
+The same columns can be written as NumPy .npy files or a Parquet table when numpy or
+pyarrow is installed.
+"""
+import importlib
+import json
+import struct
+import sys
+from array import array
+
+COLUMNS_MAGIC = b'LYRCOL1\0'
+COLUMNS_HEADER = struct.Struct('<8sI')
+ALIGNMENT = 8
+
+# Column name -> type, in file order
+COLUMNS = {
+    'song': 'string',
+    'line': 'int32',
+    'line_id': 'string',
+    'word': 'int32',
+    'syllable_index': 'int32',
+    'syllable': 'string',
+    'start': 'float64',
+    'length': 'float64',
+    'language': 'string',
+    'romanized': 'string',
+    'text': 'string',
+}
+# array typecodes of the values stored per row (string columns store int32 codes)
+TYPECODES = {'float64': 'd', 'int32': 'i', 'string': 'i'}
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+def import_optional(module, package):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(f"This export format needs {package}, which is not installed (pip install {package})") from None
+
+class SyllableColumns:
+    """
+    Per-syllable records held column by column in arrays: numbers as float64/int32 and
+    strings as int32 codes into each column's distinct values, so large catalogs stay compact.
+    """
+    def __init__(self):
+        self.rows = 0
+        self.data = {name: array(TYPECODES[kind]) for name, kind in COLUMNS.items()}
+        # String column -> {value: code}, in code order
+        self.codes = {name: {} for name, kind in COLUMNS.items() if kind == 'string'}
+
+    def append(self, record):
+        for name, values in self.data.items():
+            value = record[name]
+            codes = self.codes.get(name)
+            if codes is not None:
+                value = codes.setdefault(value, len(codes))
+            values.append(value)
+        self.rows += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def column(self, name):
+        """A column's values: an array for numbers, a list of str for strings"""
+        values = self.data[name]
+        if name in self.codes:
+            distinct = list(self.codes[name])
+            return [distinct[code] for code in values]
+        return values
+
+    def write(self, f):
+        """Writes the columns to the binary file f in the .lyc format"""
+        blocks = []
+        position = 0
+
+        def add(data):
+            nonlocal position
+            offset = position
+            padding = -len(data) % ALIGNMENT
+            blocks.append(data + bytes(padding))
+            position += len(data) + padding
+            return offset, len(data)
+
+        columns = []
+        for name, kind in COLUMNS.items():
+            column = {'name': name, 'type': kind}
+            column['offset'], column['size'] = add(_little_endian(self.data[name]).tobytes())
+            if kind == 'string':
+                encoded = [value.encode('utf-8') for value in self.codes[name]]
+                offsets = array('I', [0])
+                for value in encoded:
+                    offsets.append(offsets[-1] + len(value))
+                column['value_count'] = len(encoded)
+                column['values_offset'], column['values_size'] = add(_little_endian(offsets).tobytes() + b''.join(encoded))
+            columns.append(column)
+
+        header = json.dumps({'rows': self.rows, 'columns': columns}).encode('utf-8')
+        f.write(COLUMNS_HEADER.pack(COLUMNS_MAGIC, len(header)))
+        f.write(header)
+        f.write(bytes(-(COLUMNS_HEADER.size + len(header)) % ALIGNMENT))
+        for block in blocks:
+            f.write(block)
+
+    def numpy_column(self, name):
+        """A column as a NumPy array (strings as a fixed-width str array)"""
+        numpy = import_optional('numpy', 'numpy')
+        values = self.data[name]
+        result = numpy.frombuffer(values, dtype=values.typecode) if values else numpy.zeros(0, dtype=values.typecode)
+        if name in self.codes:
+            result = numpy.array(list(self.codes[name]) or [''], dtype=str)[result]
+        return result
+
+    def write_npy(self, name, f):
+        """Writes one column to the binary file f as a .npy array"""
+        numpy = import_optional('numpy', 'numpy')
+        numpy.save(f, self.numpy_column(name))
+
+    def to_arrow(self):
+        """The columns as a pyarrow Table, string columns dictionary-encoded, without copying the numbers"""
+        pa = import_optional('pyarrow', 'pyarrow')
+        arrays = {}
+        for name, kind in COLUMNS.items():
+            buffer = pa.py_buffer(self.data[name])
+            if kind == 'float64':
+                arrays[name] = pa.Array.from_buffers(pa.float64(), self.rows, [None, buffer])
+                continue
+            values = pa.Array.from_buffers(pa.int32(), self.rows, [None, buffer])
+            if kind == 'string':
+                values = pa.DictionaryArray.from_arrays(values, pa.array(list(self.codes[name]), pa.string()))
+            arrays[name] = values
+        return pa.table(arrays)
+
+    def write_parquet(self, f):
+        """Writes the columns to the binary file f as a Parquet table"""
+        parquet = import_optional('pyarrow.parquet', 'pyarrow')
+        parquet.write_table(self.to_arrow(), f)
+
+def read_columns(path):
+    """
+    Reads a .lyc file. Returns {name: values} in file order: an array for number
+    columns and a list of str for string columns.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, header_size = COLUMNS_HEADER.unpack_from(data)
+    if magic != COLUMNS_MAGIC:
+        raise ValueError(f"{path} is not a Lyridan columns file")
+    header = json.loads(data[COLUMNS_HEADER.size:COLUMNS_HEADER.size + header_size].decode('utf-8'))
+    base = COLUMNS_HEADER.size + header_size
+    base += -base % ALIGNMENT
+
+    def block(offset, size, typecode):
+        values = array(typecode)
+        values.frombytes(data[base + offset:base + offset + size])
+        return _little_endian(values)
+
+    columns = {}
+    for column in header['columns']:
+        values = block(column['offset'], column['size'], TYPECODES[column['type']])
+        if column['type'] == 'string':
+            count = column['value_count']
+            offsets = block(column['values_offset'], 4 * (count + 1), 'I')
+            text = base + column['values_offset'] + 4 * (count + 1)
+            distinct = [data[text + offsets[i]:text + offsets[i + 1]].decode('utf-8') for i in range(count)]
+            values = [distinct[code] for code in values]
+        columns[column['name']] = values
+    return columns
+
+def iter_rows(path):
+    """Yields the records of a .lyc file as dicts"""
+    columns = read_columns(path)
+    names = list(columns)
+    for row in zip(*columns.values()):
+        yield dict(zip(names, row))
@@ -18,7 +18,27 @@ class Config:
                 'rocksmith_export': True,
                 'lrc_save': True
             },
-            'theme': 'Dark'
+            'theme': 'Dark',
+            'cache': {
+                'enabled': True,
+                'max_size_mb': 64
+            },
+            'workers': {
+                'processes': 0,
+                'max_tasks_per_child': 100,
+                'chunk_size': 500,
+                'window': 0
+            },
+            'watch': {
+                'enabled': False,
+                'folders': [],
+                'debounce': 2.0,
+                'poll_interval': 2.0,
+                'separator': '+',
+                'romanize': False,
+                'capitalize': False,
+                'rocksmith_offset': 10.0
+            }
         }
         
         self.settings = self.load()
@@ -28,7 +48,7 @@ class Config:
         if self.config_file.exists():
             try:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    return self.merge_defaults(json.load(f), self.defaults)
             except Exception as e:
                 print(f"Error loading config: {e}")
                 return self.defaults.copy()
@@ -37,6 +57,15 @@ class Config:
             self.save(self.defaults)
             return self.defaults.copy()
     
+    def merge_defaults(self, settings, defaults):
+        """Fill in keys added since the config file was written"""
+        for key, value in defaults.items():
+            if key not in settings:
+                settings[key] = json.loads(json.dumps(value))
+            elif isinstance(value, dict) and isinstance(settings[key], dict):
+                self.merge_defaults(settings[key], value)
+        return settings
+    
     def save(self, settings=None):
         """Save config to file"""
         if settings is None:
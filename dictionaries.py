@@ -0,0 +1,417 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+
+# Overlay file looked for next to the lyrics being processed
+PROJECT_DICTIONARY = 'lyridan_dictionary.txt'
+# How often (seconds) overlay files are checked for changes
+REFRESH_INTERVAL = 2.0
+# Project folders whose overlays are kept loaded (see LayeredDictionary)
+MAX_PROJECTS = 64
+
+# Compiled index files: magic, entry count, hash slot count, version of the entries
+INDEX_MAGIC = b'LYRIDX1\0'
+INDEX_HEADER = struct.Struct('<8sII16s')
+
+def load_dictionary_file(path):
+    """
+    Reads one dictionary file in the English.txt format (one syl•la•bi•fied word per line).
+    Returns (entries, version): lowercase word -> syllabified word, and a fingerprint of the entries.
+    """
+    entries = {}
+    digest = hashlib.sha1()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and '•' in line:
+                # Store as lowercase key -> syllabified value
+                entries[line.replace('•', '').lower()] = line
+                digest.update(line.encode('utf-8') + b'\n')
+    return entries, digest.hexdigest()[:16]
+
+def compile_index(entries, version, path):
+    """
+    Writes entries (lowercase word -> syllabified word) to path as a DictionaryIndex file:
+    the header, count + 1 offsets into the data, an open-addressing hash table of entry
+    numbers (crc32 of the key, 0 for an empty slot), then every b'key\\0value' sorted by key.
+    The file is written under a temporary name and renamed, so readers never see it half written.
+    """
+    items = sorted((key.encode('utf-8'), value.encode('utf-8')) for key, value in entries.items())
+    offsets = array('I')
+    data = bytearray()
+    for key, value in items:
+        offsets.append(len(data))
+        data += key + b'\0' + value
+    offsets.append(len(data))
+
+    # At most half full, so probe sequences stay short
+    slot_count = 1 << max(1, (2 * len(items)).bit_length())
+    slots = array('I', bytes(4 * slot_count))
+    for number, (key, value) in enumerate(items, 1):
+        slot = zlib.crc32(key + b'\0') & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = number
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(items), slot_count, version.encode('ascii')))
+        f.write(offsets.tobytes())
+        f.write(slots.tobytes())
+        f.write(data)
+    try:
+        os.replace(temp_path, path)
+    except OSError:
+        # Another process got there first and has the file mapped (Windows won't replace it)
+        os.remove(temp_path)
+
+class DictionaryIndex(Mapping):
+    """
+    Read-only mapping over a compile_index file, memory-mapped and looked up in place.
+    Every process that opens the same file shares one copy of it in the OS page cache,
+    so worker processes don't each hold their own dictionary.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, slot_count, version = INDEX_HEADER.unpack_from(self.map)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a dictionary index")
+        self.version = version.decode('ascii')
+        self.mask = slot_count - 1
+        view = memoryview(self.map)
+        offsets_end = INDEX_HEADER.size + 4 * (self.count + 1)
+        slots_end = offsets_end + 4 * slot_count
+        self.offsets = view[INDEX_HEADER.size:offsets_end].cast('I')
+        self.slots = view[offsets_end:slots_end].cast('I')
+        self.data_start = slots_end
+
+    def _entry(self, i):
+        return self.map[self.data_start + self.offsets[i]:self.data_start + self.offsets[i + 1]]
+
+    def _find(self, key):
+        """Returns the value bytes stored for key, or None"""
+        if not isinstance(key, str):
+            return None
+        target = key.encode('utf-8') + b'\0'
+        slot = zlib.crc32(target) & self.mask
+        while True:
+            number = self.slots[slot]
+            if not number:
+                return None
+            entry = self._entry(number - 1)
+            if entry.startswith(target):
+                return entry[len(target):]
+            slot = (slot + 1) & self.mask
+
+    def __getitem__(self, key):
+        value = self._find(key)
+        if value is None:
+            raise KeyError(key)
+        return value.decode('utf-8')
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            entry = self._entry(i)
+            yield entry[:entry.index(b'\0')].decode('utf-8')
+
+def open_index(source_path, index_dir):
+    """
+    Returns a DictionaryIndex for the dictionary file at source_path, compiling it into
+    index_dir first if no index exists for the file's current contents.
+    """
+    digest = hashlib.sha1()
+    with open(source_path, 'rb') as f:
+        # In blocks, so a worker process opening the index doesn't grow by the file's size
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    digest = digest.hexdigest()[:16]
+    prefix = os.path.splitext(os.path.basename(source_path))[0] + '-'
+    path = os.path.join(index_dir, f"{prefix}{digest}.idx")
+    if not os.path.exists(path):
+        entries, version = load_dictionary_file(source_path)
+        os.makedirs(index_dir, exist_ok=True)
+        compile_index(entries, version, path)
+        # Indexes of older versions of the file are no longer needed
+        for name in os.listdir(index_dir):
+            if name.startswith(prefix) and name.endswith('.idx') and os.path.join(index_dir, name) != path:
+                try:
+                    os.remove(os.path.join(index_dir, name))
+                except OSError:
+                    pass
+    return DictionaryIndex(path)
+
+class DictionaryLayer:
+    """One dictionary file, reloaded only when its modification time or size changes"""
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None
+        self.entries = {}
+        self.version = ''
+
+    def refresh(self):
+        """Reloads the file if it changed; returns True if the entries changed"""
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        if stamp is None:
+            self.entries, self.version = {}, ''
+            return True
+        try:
+            self.entries, self.version = load_dictionary_file(self.path)
+        except Exception as e:
+            print(f"Warning: Could not load dictionary {self.path}: {e}")
+            self.entries, self.version = {}, ''
+        return True
+
+class IndexedLayer(DictionaryLayer):
+    """A DictionaryLayer served from a compiled, memory-mapped index in index_dir"""
+    def __init__(self, path, index_dir):
+        super().__init__(path)
+        self.index_dir = index_dir
+
+    def refresh(self):
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self.stamp or stamp is None:
+            return super().refresh()
+        try:
+            index = open_index(self.path, self.index_dir)
+        except Exception as e:
+            print(f"Warning: Could not use a compiled index for {self.path}: {e}")
+            return super().refresh()
+        self.stamp = stamp
+        self.entries, self.version = index, index.version
+        return True
+
+class OverlayView(Mapping):
+    """
+    A small dict of overlay entries looked up before a larger mapping, without copying
+    the larger one. Both are replaced on reload, never modified, so neither is copied here.
+    """
+    __slots__ = ('top', 'below')
+
+    def __init__(self, top, below):
+        self.top = top
+        self.below = below
+
+    def get(self, key, default=None):
+        value = self.top.get(key)
+        return value if value is not None else self.below.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.top.get(key)
+        return value if value is not None else self.below[key]
+
+    def __contains__(self, key):
+        return key in self.top or key in self.below
+
+    def __len__(self):
+        return len(self.below) + sum(1 for key in self.top if key not in self.below)
+
+    def __iter__(self):
+        yield from self.top
+        for key in self.below:
+            if key not in self.top:
+                yield key
+
+class _ThreadState(threading.local):
+    # The project overlay this thread uses (a class default, as looking up a missing
+    # attribute of a threading.local raises internally and costs as much as a lookup)
+    project_path = None
+
+class LayeredDictionary:
+    """
+    The bundled English.txt under per-user overlays (every .txt file in user_dir, later
+    names winning) and a per-project overlay (PROJECT_DICTIONARY in the project folder).
+    The base and user layers are merged once into a shared view: a plain dict, or the base
+    itself when the user overlays are empty. A project whose overlay is missing or empty
+    uses the shared view as is; any other project gets an OverlayView of its own small
+    dict over it. A changed file only reloads that file and rebuilds the views it is in.
+    With index_dir, the base dictionary is compiled there once and memory-mapped (see
+    DictionaryIndex) instead. Worker processes use this to share one copy; the user
+    overlays then go in an OverlayView over the index, since copying it would undo that.
+
+    Safe to share between threads. The project folder is chosen per thread. The last
+    MAX_PROJECTS project folders used are kept loaded; a thread still on one that was
+    dropped loads it again on its next lookup. Views are swapped in whole, never modified
+    in place, so lookups need no lock.
+    """
+    def __init__(self, base_path, user_dir=None, index_dir=None):
+        self.lock = threading.RLock()
+        self.local = _ThreadState()
+        self.base = IndexedLayer(base_path, index_dir) if index_dir else DictionaryLayer(base_path)
+        self.user_dir = user_dir
+        self.user_layers = {}
+        # Overlay path -> DictionaryLayer for the project folders used most recently, oldest first
+        self.project_layers = OrderedDict()
+        # Overlay path (None for the shared view) -> (merged mapping, version)
+        self.views = {}
+        self.last_check = 0.0
+        self.refresh(force=True)
+
+    def _project_path(self):
+        return self.local.project_path
+
+    @property
+    def project(self):
+        """This thread's project overlay layer, or None"""
+        path = self._project_path()
+        return self.project_layers.get(path) if path else None
+
+    def project_dir(self):
+        """This thread's project folder, or None"""
+        path = self._project_path()
+        return os.path.dirname(path) if path else None
+
+    def set_project_dir(self, project_dir):
+        """Uses the overlay in project_dir (if any) in this thread from now on; None removes the project layer"""
+        path = os.path.join(project_dir, PROJECT_DICTIONARY) if project_dir else None
+        if path:
+            self._load_project(path)
+        self.local.project_path = path
+
+    def _load_project(self, path):
+        """Makes sure the project overlay at path is loaded and has a view, and marks it most recently used"""
+        with self.lock:
+            layer = self.project_layers.get(path)
+            if layer is not None:
+                self.project_layers.move_to_end(path)
+                return
+            layer = DictionaryLayer(path)
+            layer.refresh()
+            self.project_layers[path] = layer
+            views = dict(self.views)
+            while len(self.project_layers) > MAX_PROJECTS:
+                old_path, old_layer = self.project_layers.popitem(last=False)
+                views.pop(old_path, None)
+            views[path] = self._project_view(views[None], layer)
+            self.views = views
+
+    def user_files(self):
+        try:
+            names = sorted(name for name in os.listdir(self.user_dir) if name.lower().endswith('.txt'))
+        except OSError:
+            return []
+        return [os.path.join(self.user_dir, name) for name in names]
+
+    def refresh(self, force=False):
+        """
+        Checks the dictionary files for changes, at most every REFRESH_INTERVAL seconds
+        unless force is set, and rebuilds the views of the layers that changed.
+        Without force, a thread that finds another thread already checking doesn't wait.
+        """
+        if not force and time.monotonic() - self.last_check < REFRESH_INTERVAL:
+            return
+        if not self.lock.acquire(blocking=force):
+            return
+        try:
+            now = time.monotonic()
+            if not force and now - self.last_check < REFRESH_INTERVAL:
+                return
+            self.last_check = now
+            shared_changed = force
+            shared_changed |= self.base.refresh()
+
+            if self.user_dir:
+                paths = self.user_files()
+                for path in list(self.user_layers):
+                    if path not in paths:
+                        del self.user_layers[path]
+                        shared_changed = True
+                for path in paths:
+                    if path not in self.user_layers:
+                        self.user_layers[path] = DictionaryLayer(path)
+                    shared_changed |= self.user_layers[path].refresh()
+
+            views = dict(self.views)
+            if shared_changed:
+                views[None] = self._shared_view()
+            for path, layer in self.project_layers.items():
+                if layer.refresh() or shared_changed:
+                    views[path] = self._project_view(views[None], layer)
+            self.views = views
+        finally:
+            self.lock.release()
+
+    def _shared_view(self):
+        """(the base and user layers merged, their combined version)"""
+        layers = [self.base] + [self.user_layers[path] for path in sorted(self.user_layers)]
+        base = self.base.entries
+        overlays = [layer.entries for layer in layers[1:] if layer.entries]
+        if not overlays:
+            # Layers are replaced on reload, never modified, so the base can be used as is
+            merged = base
+        else:
+            top = {}
+            for entries in overlays:
+                top.update(entries)
+            if isinstance(base, dict):
+                merged = dict(base)
+                merged.update(top)
+            else:
+                merged = OverlayView(top, base)
+        return merged, _combined_version(layer.version for layer in layers)
+
+    def _project_view(self, shared, layer):
+        """(a project layer over the shared view, their combined version); the shared view itself without entries"""
+        if not layer.entries:
+            return shared
+        return OverlayView(layer.entries, shared[0]), _combined_version([shared[1], layer.version])
+
+    def _current_view(self):
+        views = self.views
+        path = self._project_path()
+        view = views.get(path)
+        if view is None:
+            if path is None:
+                return views[None]
+            # Dropped from the recently used projects by another thread
+            self._load_project(path)
+            view = self.views[path]
+        return view
+
+    @property
+    def merged(self):
+        """This thread's merged lookup mapping, as of the last refresh"""
+        return self._current_view()[0]
+
+    @property
+    def version(self):
+        """Fingerprint of the layers this thread looks words up in"""
+        return self._current_view()[1]
+
+    def current(self):
+        """This thread's merged lookup mapping, after a (rate-limited) check for changed overlays"""
+        # Inlines refresh's rate limit and the common case of _current_view, as this runs for every line
+        if time.monotonic() - self.last_check >= REFRESH_INTERVAL:
+            self.refresh()
+        views = self.views
+        # Only the shared view while no thread has used a project folder
+        view = views[None] if len(views) == 1 else views.get(self.local.project_path)
+        return view[0] if view is not None else self._current_view()[0]
+
+def _combined_version(versions):
+    return hashlib.sha1(' '.join(versions).encode('utf-8')).hexdigest()[:16]
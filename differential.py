@@ -0,0 +1,359 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import groupby
+
+import kana
+import syllabize
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Revision syllabize_reference.py is frozen from: syllabize.py before the performance work.
+# The current code must produce its output, apart from the ALLOWED_DIVERGENCES below.
+REFERENCE_REVISION = '5faa3aa'
+REFERENCE_HEADER = (
+    "# Frozen copy of syllabize.py at revision {revision}, for differential.py, which checks that\n"
+    "# the current code still produces its output (apart from the divergences it allows).\n"
+    "# It reads English.txt itself and imports none of the live modules. Do not edit or optimize\n"
+    "# this file; regenerate it with: python differential.py --freeze\n"
+)
+
+HIRAGANA = 'あいうえおかきくけこがぎぐげごさしすせそざじずぜぞたちつてとだでどなにぬねのはひふへほばびぶべぼぱぴぷぺぽまみむめもやゆよらりるれろわをん'
+SMALL_KANA = 'ゃゅょぁぃぅぇぉ'
+KANJI_WORDS = ['東京', '漢字', '世界', '夢', '君', '心', '歌', '今日', '明日', '大丈夫', '気持ち', '忘れ', '見て',
+               '声', '聞こえる', '果て', '愛', '空', '時間', '行きます', '日本語', '学校', '写真', '一緒']
+RUSSIAN_WORDS = ['привет', 'мир', 'любовь', 'звезда', 'ночь', 'сердце', 'дорога', 'объявление', 'музыка',
+                 'весна', 'счастье', 'подъезд', 'йогурт', 'Москва', 'песня', 'жизнь', 'воробьи']
+RUSSIAN_CONSONANTS = 'бвгджзклмнпрстфхцчшщй'
+RUSSIAN_VOWELS = 'аеёиоуыэюя'
+ENGLISH_CONSONANTS = 'bcdfghjklmnprstvwxyz'
+ENGLISH_CLUSTERS = ['th', 'ch', 'sh', 'ph', 'st', 'tr', 'gr', 'pl', 'ck', 'ng', 'qu']
+ENGLISH_VOWELS = ['a', 'e', 'i', 'o', 'u', 'y', 'ea', 'ou', 'ie', 'oo', 'ai']
+PUNCTUATION = [('', ''), ('', ','), ('"', '"'), ('(', ')'), ('', '!'), ('', '...'), ("'", ''), ('', '?')]
+# Fixed process_line results for words with っ and ん, checked on their own rather than
+# against the reference: (lyric text, romanize, expected output). The romanized ones
+# depend on pykakasi's readings and are skipped without it.
+SOKUON_HATSUON_CASES = [
+    ('ずっと', False, 'ずっ+と'),
+    ('こんな', False, 'こん+な'),
+    ('ってか', False, 'って+か'),
+    ('ずっと', True, 'zut+to'),
+    ('がっこう', True, 'gak+ko+u'),
+    ('いっしょ', True, 'is+sho'),
+    ('マッチ', True, 'mat+chi'),
+    ('ちょっと', True, 'chot+to'),
+    ('ってか', True, 'tte+ka'),
+    ('笑って', True, 'wa+rat+te'),
+    ('行っちゃった', True, 'it+chat+ta'),
+    ('待っててね', True, 'mat+te+te+ne'),
+    ('こんな', True, 'kon+na'),
+    ('こんにゃく', True, 'kon+nya+ku'),
+    ('かんよう', True, 'kan+yo+u'),
+    ('きんえん', True, 'kin+en'),
+    ('原因', True, 'gen+in'),
+    ('今夜', True, 'kon+ya'),
+    ('天然', True, 'ten+nen'),
+]
+
+def regrouped_kana(name, args, want, got):
+    """Text with kana, split at different places but otherwise unchanged"""
+    text, separator = args[0], args[1]
+    return not kana.KANA.isdisjoint(text) and want.replace(separator, '') == got.replace(separator, '')
+
+def romaji_from_kana(name, args, want, got):
+    """A romanized Japanese line"""
+    line, romanize = args[0], args[2]
+    match = syllabize.LRC_LINE_RE.match(line)
+    return bool(romanize and match and syllabize.detect_language(match.group(2)) == 'japanese')
+
+def japanese_ttml_line(name, args, want, got):
+    """An exported TTML line with Japanese in it"""
+    return any(syllabize.JAPANESE_RE.search(span['text']) for span in args[-1])
+
+# Intended output changes since REFERENCE_REVISION: (what changed, the functions it affects,
+# the check that recognizes an input it explains). A divergence one of these explains is
+# counted as allowed instead of failing the run; new intended changes get an entry here.
+ALLOWED_DIVERGENCES = [
+    ("kana are split into morae and grouped around っ and ん (ずっ+と, きょ+う) instead of "
+     "one kana per syllable", ['syllabize_word', 'process_line'], regrouped_kana),
+    ("romanized Japanese lines are split from each kakasi token's kana reading (kon+ya, "
+     "wa+rat+te, no apostrophes) instead of from its romaji; locked by SOKUON_HATSUON_CASES",
+     ['process_line'], romaji_from_kana),
+    ("Japanese TTML lines are romanized as a whole and the romaji shared out over their spans, "
+     "so a word split over two spans keeps its reading (大丈|夫: dai+jou+bu)",
+     ['export_rocksmith_xml'], japanese_ttml_line),
+]
+
+def allowed_divergence(name, args, want, got):
+    """The ALLOWED_DIVERGENCES entry that explains a divergence, or None"""
+    for allowed in ALLOWED_DIVERGENCES:
+        description, functions, explains = allowed
+        if name in functions and explains(name, args, want, got):
+            return allowed
+    return None
+
+def freeze(revision):
+    """Writes syllabize.py as it was at revision to syllabize_reference.py"""
+    result = subprocess.run(['git', 'show', f"{revision}:syllabize.py"], cwd=HERE, capture_output=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Could not read syllabize.py at {revision}: {result.stderr.decode(errors='replace').strip()}")
+    source = result.stdout
+    newline = b'\r\n' if b'\r\n' in source else b'\n'
+    header = REFERENCE_HEADER.format(revision=revision).encode('utf-8').replace(b'\n', newline)
+    with open(os.path.join(HERE, 'syllabize_reference.py'), 'wb') as f:
+        f.write(header + source)
+    print(f"Froze syllabize_reference.py from {revision}")
+
+def pinned_engine():
+    """
+    The engine the current code runs on: English.txt alone, like the reference, so the
+    user's and project dictionaries can't make it diverge.
+    """
+    return syllabize.LyridanEngine(syllabize.EngineResources(os.path.join(HERE, 'English.txt')))
+
+def english_words(limit=0):
+    """Every word in English.txt (or the first limit), as written in lyrics"""
+    words = []
+    with open(os.path.join(HERE, 'English.txt'), 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and '•' in line:
+                words.append(line.replace('•', ''))
+                if limit and len(words) >= limit:
+                    break
+    return words
+
+def decorate(rng, word):
+    """word with random capitalization and surrounding punctuation"""
+    style = rng.random()
+    if style < 0.2:
+        word = word.capitalize()
+    elif style < 0.25:
+        word = word.upper()
+    before, after = rng.choice(PUNCTUATION)
+    return before + word + after
+
+def pseudo_english(rng):
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        parts.append(rng.choice(ENGLISH_CLUSTERS) if rng.random() < 0.3 else rng.choice(ENGLISH_CONSONANTS))
+        parts.append(rng.choice(ENGLISH_VOWELS))
+    if rng.random() < 0.5:
+        parts.append(rng.choice(ENGLISH_CONSONANTS) + rng.choice(['', 'e', 's', 'ed', 'ing', "'s"]))
+    return ''.join(parts)
+
+def pseudo_japanese(rng):
+    parts = []
+    for _ in range(rng.randint(1, 6)):
+        roll = rng.random()
+        if roll < 0.15:
+            parts.append(rng.choice(KANJI_WORDS))
+        elif roll < 0.25:
+            parts.append(rng.choice('きしちにひみりぎじびぴ') + rng.choice(SMALL_KANA[:3]))
+        elif roll < 0.3:
+            parts.append('っ')
+        elif roll < 0.33:
+            parts.append('ー')
+        elif roll < 0.35:
+            parts.append(rng.choice(['ok', 'Baby', '!', '、']))
+        else:
+            parts.append(rng.choice(HIRAGANA))
+    word = ''.join(parts)
+    if rng.random() < 0.3:
+        # Katakana
+        word = ''.join(chr(ord(c) + 0x60) if 'ぁ' <= c <= 'ゖ' else c for c in word)
+    return word
+
+def pseudo_russian(rng):
+    if rng.random() < 0.3:
+        return rng.choice(RUSSIAN_WORDS)
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        parts.append(rng.choice(RUSSIAN_CONSONANTS) * rng.choice([1, 1, 2]) + rng.choice(RUSSIAN_VOWELS))
+    if rng.random() < 0.4:
+        parts.append(rng.choice(RUSSIAN_CONSONANTS) + rng.choice(['', 'ь', 'ъ']))
+    return ''.join(parts)
+
+class Corpus:
+    """The inputs both implementations are run on"""
+    def __init__(self, seed=1, generated=20000, english_limit=0):
+        rng = random.Random(seed)
+        dictionary = english_words(english_limit)
+        self.english = dictionary + [decorate(rng, word) for word in dictionary]
+        self.english += [decorate(rng, pseudo_english(rng)) for _ in range(generated)]
+        self.japanese = [pseudo_japanese(rng) for _ in range(generated)]
+        self.russian = [pseudo_russian(rng) for _ in range(generated)]
+
+        pools = [self.english, self.japanese, self.russian]
+        self.lines = []
+        for i in range(generated // 4):
+            # Mostly one language per line, sometimes mixed
+            line_pools = pools if rng.random() < 0.1 else [rng.choice(pools)]
+            words = [rng.choice(rng.choice(line_pools)) for _ in range(rng.randint(1, 8))]
+            self.lines.append(f"[{syllabize.format_lrc_time(i * 3.1)}] {' '.join(words)}")
+        self.lines += ['', '[ar:Artist]', 'no timestamp here', '[00:01.00]', '[00:02.00]   spaced   out  ']
+
+        self.spans = []
+        for l_idx, line in enumerate(self.lines[:2000]):
+            match = syllabize.LRC_LINE_RE.match(line)
+            words = match.group(2).split() if match else []
+            start = l_idx * 4.0
+            for w_idx, word in enumerate(words):
+                # Some words are split into two spans with no space between them, as TTML does
+                pieces = [word[:len(word) // 2], word[len(word) // 2:]] if len(word) > 3 and rng.random() < 0.3 else [word]
+                for p_idx, piece in enumerate(pieces):
+                    text = piece + (' ' if p_idx == len(pieces) - 1 and w_idx < len(words) - 1 else '')
+                    self.spans.append({'start': start, 'end': start + 0.3, 'text': text, 'line_id': f"L{l_idx + 1}"})
+                    start += 0.3
+
+def write_beatmap(path, count=2000, tempo=120.0):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<song><ebeats>\n')
+        for i in range(count):
+            f.write(f'<ebeat time="{i * 60.0 / tempo + 0.37:.3f}" measure="{i // 4 if i % 4 == 0 else -1}"/>\n')
+        f.write('</ebeats></song>\n')
+
+def make_checks(corpus, workdir):
+    """
+    Returns (name, inputs, run) for every compared function, where run(module, args)
+    calls the function in module (the reference or syllabize) with one input.
+    """
+    beatmap = os.path.join(workdir, 'beatmap.xml')
+    write_beatmap(beatmap)
+
+    def export(module, args):
+        offset, beatmap_path, empty_measure, spans = args
+        path = os.path.join(workdir, f"{module.__name__}.xml")
+        module.export_rocksmith_xml(spans, path, offset=offset, beatmap_path=beatmap_path,
+                                    empty_measure=empty_measure)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    separators = ['+', '-']
+    words = [(word, 'other') for word in corpus.english] + [(word, 'japanese') for word in corpus.japanese]
+    # One export per TTML line, so a divergence points at the line it comes from
+    ttml_lines = [list(spans) for line_id, spans in groupby(corpus.spans, key=lambda span: span['line_id'])]
+    return [
+        ('detect_language',
+         [(text,) for text in corpus.english + corpus.japanese + corpus.russian + corpus.lines],
+         lambda module, args: module.detect_language(*args)),
+        ('syllabize_english_word',
+         [(word, sep) for word in corpus.english for sep in separators],
+         lambda module, args: module.syllabize_english_word(*args)),
+        ('syllabize_word',
+         [(word, sep, language) for word, language in words for sep in separators],
+         lambda module, args: module.syllabize_word(*args)),
+        ('syllabize_russian_word',
+         [(word, sep) for word in corpus.russian for sep in separators],
+         lambda module, args: module.syllabize_russian_word(*args)),
+        ('process_line',
+         [(line, sep, romanize, capitalize) for line in corpus.lines for sep in separators
+          for romanize in (False, True) for capitalize in (False, True)],
+         lambda module, args: module.process_line(args[0], separator=args[1], romanize=args[2], capitalize=args[3])),
+        ('export_rocksmith_xml',
+         [settings + (spans,) for settings in [(10.0, None, False), (0.0, beatmap, False), (10.0, beatmap, True)]
+          for spans in ttml_lines],
+         export),
+    ]
+
+def check_fixed_cases(show):
+    """Runs SOKUON_HATSUON_CASES through process_line; returns the number that failed"""
+    failed = 0
+    for text, romanize, expected in SOKUON_HATSUON_CASES:
+        if romanize and not syllabize.get_kakasi():
+            continue
+        got = syllabize.process_line(f"[00:01.00]{text}", romanize=romanize)
+        if got != expected:
+            if failed < show:
+                print(f"    {text!r} (romanize={romanize}): expected {expected!r}, got {got!r}")
+            failed += 1
+    return failed
+
+def run_all(module, inputs, run):
+    start = time.perf_counter()
+    results = [run(module, args) for args in inputs]
+    return results, time.perf_counter() - start
+
+def shorten(value, limit=120):
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + '...'
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the processing functions against the frozen reference copy and time both.")
+    parser.add_argument('--freeze', nargs='?', const=REFERENCE_REVISION, metavar='REVISION',
+                        help=f"copy syllabize.py at REVISION (default: {REFERENCE_REVISION}) into the reference and exit")
+    parser.add_argument('--only', nargs='+', help="functions to compare (default: all)")
+    parser.add_argument('--seed', type=int, default=1, help="seed for the generated corpus")
+    parser.add_argument('--generated', type=int, default=20000, help="generated words per language")
+    parser.add_argument('--english-limit', type=int, default=0, help="use only the first N words of English.txt (0 = all)")
+    parser.add_argument('--show', type=int, default=5, help="divergences to print per function")
+    parser.add_argument('--show-allowed', action='store_true', help="also print divergences that ALLOWED_DIVERGENCES explains")
+    args = parser.parse_args()
+
+    if args.freeze:
+        freeze(args.freeze)
+        return
+    try:
+        import syllabize_reference as reference
+    except ImportError:
+        print("No reference copy found; create it with: python differential.py --freeze")
+        sys.exit(1)
+
+    engine = pinned_engine()
+    engine.warm_up()
+    corpus = Corpus(args.seed, args.generated, args.english_limit)
+
+    failures = []
+    allowed_counts = {}
+    print(f"{'function':<24} {'inputs':>8} {'reference (s)':>14} {'current (s)':>12} {'speedup':>8} {'allowed':>8} {'diverged':>9}")
+    with tempfile.TemporaryDirectory() as workdir, engine.active():
+        for name, inputs, run in make_checks(corpus, workdir):
+            if args.only and name not in args.only:
+                continue
+            expected, reference_time = run_all(reference, inputs, run)
+            actual, current_time = run_all(syllabize, inputs, run)
+            diverged = []
+            allowed = []
+            for case, want, got in zip(inputs, expected, actual):
+                if want == got:
+                    continue
+                explained = allowed_divergence(name, case, want, got)
+                if explained:
+                    allowed.append((case, want, got))
+                    allowed_counts[explained[0]] = allowed_counts.get(explained[0], 0) + 1
+                else:
+                    diverged.append((case, want, got))
+            speedup = reference_time / current_time if current_time else float('inf')
+            print(f"{name:<24} {len(inputs):>8} {reference_time:>14.3f} {current_time:>12.3f} {speedup:>7.2f}x "
+                  f"{len(allowed):>8} {len(diverged):>9}")
+            for case, want, got in diverged[:args.show] + (allowed[:args.show] if args.show_allowed else []):
+                print(f"    input     {shorten(case)}")
+                print(f"    reference {shorten(want)}")
+                print(f"    current   {shorten(got)}")
+            if diverged:
+                failures.append(f"{name}: {len(diverged)} of {len(inputs)} inputs diverged")
+
+        failed = check_fixed_cases(args.show)
+    print(f"{'sokuon/hatsuon cases':<24} {len(SOKUON_HATSUON_CASES):>8} {'':>14} {'':>12} {'':>8} {'':>8} {failed:>9}")
+    if failed:
+        failures.append(f"sokuon/hatsuon cases: {failed} of {len(SOKUON_HATSUON_CASES)} gave a different result")
+
+    if allowed_counts:
+        print("\nAllowed divergences:")
+        for description, count in allowed_counts.items():
+            print(f"  {count:>8}  {description}")
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        print("\nIf a change is intended, describe it in ALLOWED_DIVERGENCES (and bump PROCESSING_VERSION).")
+        sys.exit(1)
+    print("\nThe current code matches the reference.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import threading
+
+import columnar
+import syllabize
+
+def analyze_segment(item, romanized=None, english_dict=None):
+    """
+    Romanizes and syllabizes one extract_ttml_data span.
+    Returns {'start', 'end', 'text', 'romanized', 'words'}, where words is a list of
+    words, each a list of syllables {'text', 'start', 'end'} splitting the span evenly.
+    romanized is the span's text from syllabize.romanize_line_spans, if already known.
+    """
+    if romanized is None:
+        romanized = syllabize.romanize_segment(item['text'])
+    words = [syllabize.word_syllables(word, english_dict) for word in romanized.split()]
+    count = sum(len(word) for word in words)
+    step = (item['end'] - item['start']) / count if count else 0.0
+
+    index = 0
+    timed_words = []
+    for word in words:
+        timed_word = []
+        for syl in word:
+            start = item['start'] + index * step
+            timed_word.append({'text': syl, 'start': start, 'end': start + step})
+            index += 1
+        timed_words.append(timed_word)
+
+    return {
+        'start': item['start'],
+        'end': item['end'],
+        'text': item['text'],
+        'romanized': romanized,
+        'words': timed_words
+    }
+
+def iter_song_lines(data):
+    """
+    Groups extract_ttml_data spans into lines, analyzing every span exactly once.
+    Yields {'line_id', 'start', 'end', 'segments'} with one analyze_segment() result per span.
+    """
+    for line_id, spans in syllabize.iter_ttml_lines(data):
+        romanized = syllabize.romanize_line_spans(spans)
+        english_dict = syllabize.get_english_dict()
+        yield {
+            'line_id': line_id,
+            'start': spans[0]['start'],
+            'end': max(item['end'] for item in spans),
+            'segments': [analyze_segment(item, text, english_dict) for item, text in zip(spans, romanized)]
+        }
+
+def build_song_model(data):
+    return list(iter_song_lines(data))
+
+def line_words(line):
+    """
+    The words of an iter_song_lines() line, each a list of its syllables. A word the TTML
+    splits across spans (no space after a span) is one word.
+    """
+    words = []
+    joined = False
+    for segment in line['segments']:
+        for w_idx, word in enumerate(segment['words']):
+            if w_idx == 0 and joined and words:
+                words[-1] = words[-1] + word
+            else:
+                words.append(list(word))
+        joined = not segment['text'][-1:].isspace()
+    return words
+
+def syllable_records(line, song="", line_number=0):
+    """
+    Flattens one iter_song_lines() line into a record per syllable (see columnar.COLUMNS):
+    song, line (its number), line_id, word (index in the line), syllable_index (in the word),
+    syllable, start and length in TTML seconds, language (syllabize.detect_language of the
+    span), and the romanized and original text of the span. A word split across spans
+    keeps one word index.
+    """
+    word = syllable_index = 0
+    for segment in line['segments']:
+        language = syllabize.detect_language(segment['text'])
+        words = segment['words']
+        for w_idx, syllables in enumerate(words):
+            for syl in syllables:
+                yield {
+                    'song': song,
+                    'line': line_number,
+                    'line_id': line['line_id'],
+                    'word': word,
+                    'syllable_index': syllable_index,
+                    'syllable': syl['text'],
+                    'start': syl['start'],
+                    'length': syl['end'] - syl['start'],
+                    'language': language,
+                    'romanized': segment['romanized'],
+                    'text': segment['text'],
+                }
+                syllable_index += 1
+            # The span's last word goes on in the next span unless the TTML had a space after it
+            if w_idx < len(words) - 1 or segment['text'][-1:].isspace():
+                word += 1
+                syllable_index = 0
+
+def iter_song_records(data, song=""):
+    """Yields syllable_records() for every line of extract_ttml_data spans"""
+    for line_number, line in enumerate(iter_song_lines(data)):
+        yield from syllable_records(line, song, line_number)
+
+class LRCWriter:
+    """Syllabized LRC: one [mm:ss.xx] line per lyric line, syllables joined with separator"""
+    def __init__(self, f, separator="+"):
+        self.f = f
+        self.separator = separator
+
+    def begin(self):
+        pass
+
+    def write_line(self, line):
+        words = [self.separator.join(syl['text'] for syl in word) for word in line_words(line)]
+        self.f.write(f"[{syllabize.format_lrc_time(line['start'])}] {' '.join(words)}\n")
+
+    def end(self):
+        pass
+
+class EnhancedLRCWriter:
+    """Enhanced (A2) LRC: a <mm:ss.xx> tag per romanized segment, or per syllable with per_syllable"""
+    def __init__(self, f, per_syllable=False):
+        self.f = f
+        self.per_syllable = per_syllable
+
+    def begin(self):
+        pass
+
+    def write_line(self, line):
+        fmt = syllabize.format_lrc_time
+        parts = [f"[{fmt(line['start'])}]"]
+        for segment in line['segments']:
+            if self.per_syllable:
+                words = ["".join(f"<{fmt(syl['start'])}>{syl['text']}" for syl in word)
+                         for word in segment['words']]
+                parts.append(' '.join(words))
+            else:
+                parts.append(f"<{fmt(segment['start'])}>{segment['romanized'].strip()}")
+            # Keep the word break the TTML had after this span
+            if segment['text'][-1:].isspace():
+                parts.append(' ')
+        parts[-1] = parts[-1].rstrip()
+        self.f.write(f"{''.join(parts)}<{fmt(line['end'])}>\n")
+
+    def end(self):
+        pass
+
+class UltraStarWriter:
+    """UltraStar TXT with one note per syllable, timed from the TTML spans (pitch left at 0)"""
+    # UltraStar counts quarter beats, so 300 BPM gives 50 ms per beat
+    BPM = 300
+    SECONDS_PER_BEAT = 60.0 / (BPM * 4)
+
+    def __init__(self, f, title="", artist=""):
+        self.f = f
+        self.title = title
+        self.artist = artist
+        self.last_beat = None
+
+    def beat(self, seconds):
+        return int(round(seconds / self.SECONDS_PER_BEAT))
+
+    def begin(self):
+        self.f.write(f"#TITLE:{self.title}\n#ARTIST:{self.artist}\n#BPM:{self.BPM}\n#GAP:0\n")
+
+    def write_line(self, line):
+        notes = []
+        for word in line_words(line):
+            for s_idx, syl in enumerate(word):
+                text = syl['text']
+                # A leading space marks the start of a new word
+                if s_idx == 0 and notes:
+                    text = " " + text
+                start = self.beat(syl['start'])
+                length = max(1, self.beat(syl['end']) - start)
+                notes.append((start, length, text))
+        if not notes:
+            return
+
+        if self.last_beat is not None:
+            self.f.write(f"- {min(self.last_beat, notes[0][0])}\n")
+        for start, length, text in notes:
+            self.f.write(f": {start} {length} 0 {text}\n")
+        self.last_beat = notes[-1][0] + notes[-1][1]
+
+    def end(self):
+        self.f.write("E\n")
+
+class RocksmithWriter:
+    """
+    Rocksmith vocals XML, through syllabize's time, snap and serialize stages, so the
+    output is the same as export_rocksmith_xml's
+    """
+    def __init__(self, output_path, offset=10.0, beats=None, empty_measure=False):
+        self.output_path = output_path
+        self.beats = beats or []
+        self.offset = syllabize.rocksmith_offset(offset, self.beats, empty_measure)
+        self.records = []
+        self.success = False
+
+    def begin(self):
+        self.records = []
+
+    def write_line(self, line):
+        # The analyzed segments as syllabize_stage records (one per span)
+        segments = line['segments']
+        for seg_idx, segment in enumerate(segments):
+            self.records.append({
+                'start': segment['start'],
+                'end_of_phrase': seg_idx == len(segments) - 1,
+                'words': [[syl['text'] for syl in word] for word in segment['words']],
+            })
+
+    def end(self):
+        records = syllabize.snap_stage(syllabize.time_stage(self.records, self.offset), self.beats)
+        try:
+            syllabize.write_rocksmith_vocals(records, self.output_path, len(self.records))
+            self.success = True
+        except Exception as e:
+            print(f"Error writing XML: {e}")
+
+class JSONWriter:
+    """The timed syllable model itself, as {"lines": [...]}"""
+    def __init__(self, f):
+        self.f = f
+        self.first = True
+
+    def begin(self):
+        self.f.write('{"lines": [\n')
+
+    def write_line(self, line):
+        if not self.first:
+            self.f.write(',\n')
+        self.f.write(json.dumps(line, ensure_ascii=False))
+        self.first = False
+
+    def end(self):
+        self.f.write('\n]}\n')
+
+class SyllableJSONLWriter:
+    """JSON Lines: one syllable_records() object per line"""
+    def __init__(self, f, song=""):
+        self.f = f
+        self.start_song(song)
+
+    def start_song(self, song):
+        """Labels the records of the lines that follow with song, numbering its lines from 0"""
+        self.song = song
+        self.line_number = 0
+
+    def begin(self):
+        pass
+
+    def write_line(self, line):
+        for record in syllable_records(line, self.song, self.line_number):
+            self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.line_number += 1
+
+    def end(self):
+        pass
+
+class ColumnarWriter:
+    """
+    syllable_records() as columns (see columnar.SyllableColumns), saved at the end as a
+    .lyc file ('columns'), a folder of <column>.npy files ('npy', needs numpy) or a
+    Parquet file ('parquet', needs pyarrow)
+    """
+    def __init__(self, output_path, fmt='columns', song=""):
+        if fmt not in ('columns', 'npy', 'parquet'):
+            raise ValueError(f"Unknown columnar format: {fmt}")
+        # Fail now rather than after the whole analysis if the library is missing
+        if fmt == 'npy':
+            columnar.import_optional('numpy', 'numpy')
+        elif fmt == 'parquet':
+            columnar.import_optional('pyarrow.parquet', 'pyarrow')
+        self.output_path = output_path
+        self.fmt = fmt
+        self.columns = columnar.SyllableColumns()
+        self.start_song(song)
+
+    def start_song(self, song):
+        """Labels the records of the lines that follow with song, numbering its lines from 0"""
+        self.song = song
+        self.line_number = 0
+
+    def begin(self):
+        pass
+
+    def write_line(self, line):
+        self.columns.extend(syllable_records(line, self.song, self.line_number))
+        self.line_number += 1
+
+    def end(self):
+        if self.fmt == 'columns':
+            with atomic_open(self.output_path, binary=True) as f:
+                self.columns.write(f)
+        elif self.fmt == 'parquet':
+            with atomic_open(self.output_path, binary=True) as f:
+                self.columns.write_parquet(f)
+        else:
+            os.makedirs(self.output_path, exist_ok=True)
+            for name in columnar.COLUMNS:
+                with atomic_open(os.path.join(self.output_path, name + '.npy'), binary=True) as f:
+                    self.columns.write_npy(name, f)
+
+# Per-syllable record formats, which export_song and bundles.export_bundle_records can write
+RECORD_FORMATS = ('jsonl', 'columns', 'npy', 'parquet')
+
+def export_song(data, outputs, separator="+", title="", artist="", offset=10.0, beatmap_path=None, empty_measure=False,
+                per_syllable=False):
+    """
+    Analyzes extract_ttml_data spans once and writes every requested format in the same pass.
+    outputs maps a format ('lrc', 'enhanced_lrc', 'ultrastar', 'rocksmith', 'json', or one of
+    RECORD_FORMATS) to its output path. title also labels the per-syllable records.
+    Returns True if every output was written.
+    """
+    files = []
+    writers = []
+    try:
+        for fmt, path in outputs.items():
+            if fmt == 'rocksmith':
+                beats = syllabize.parse_rocksmith_beatmap(beatmap_path) if beatmap_path else []
+                writers.append(RocksmithWriter(path, offset, beats, empty_measure))
+                continue
+            if fmt in ('columns', 'npy', 'parquet'):
+                writers.append(ColumnarWriter(path, fmt, title))
+                continue
+            f = open(path, 'w', encoding='utf-8')
+            files.append(f)
+            if fmt == 'lrc':
+                writers.append(LRCWriter(f, separator))
+            elif fmt == 'enhanced_lrc':
+                writers.append(EnhancedLRCWriter(f, per_syllable))
+            elif fmt == 'ultrastar':
+                writers.append(UltraStarWriter(f, title, artist))
+            elif fmt == 'json':
+                writers.append(JSONWriter(f))
+            elif fmt == 'jsonl':
+                writers.append(SyllableJSONLWriter(f, title))
+            else:
+                raise ValueError(f"Unknown export format: {fmt}")
+
+        for writer in writers:
+            writer.begin()
+        for line in iter_song_lines(data):
+            for writer in writers:
+                writer.write_line(line)
+        for writer in writers:
+            writer.end()
+        return all(writer.success for writer in writers if isinstance(writer, RocksmithWriter))
+    except Exception as e:
+        print(f"Error exporting song: {e}")
+        return False
+    finally:
+        for f in files:
+            f.close()
+
+# Formats save_processed_lines can write, by file extension
+LINE_FORMATS = {'.txt': 'text', '.lrc': 'lrc', '.json': 'json'}
+# Lines handed to writelines() at a time
+WRITE_CHUNK = 1000
+
+@contextlib.contextmanager
+def atomic_open(path, encoding='utf-8', binary=False):
+    """
+    Opens a temporary file next to path for writing (in binary mode with binary) and moves
+    it over path once the block finishes, so path is never left half written. On error the
+    temporary file is removed.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with (open(temp_path, 'xb') if binary else open(temp_path, 'x', encoding=encoding)) as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def format_for_path(path):
+    """The save_processed_lines format for path's extension ('text' if it is unknown)"""
+    return LINE_FORMATS.get(os.path.splitext(path)[1].lower(), 'text')
+
+def iter_formatted_lines(original_lines, processed_lines, fmt):
+    """
+    Yields the output of one format line by line (newlines included):
+    'text' is the syllabized lyrics only, 'lrc' puts each line's timestamp back in front
+    and 'json' pairs every original line with its syllabized text.
+    """
+    if fmt == 'text':
+        for line in processed_lines:
+            yield line + '\n'
+    elif fmt == 'lrc':
+        for original, line in zip(original_lines, processed_lines):
+            match = syllabize.LRC_LINE_RE.match(original)
+            if match:
+                line = f"{match.group(1)} {line.strip()}".rstrip()
+            yield line + '\n'
+    elif fmt == 'json':
+        yield '{"lines": [\n'
+        for index, (original, line) in enumerate(zip(original_lines, processed_lines)):
+            entry = json.dumps({'original': original, 'syllabized': line}, ensure_ascii=False)
+            yield (',\n' if index else '') + entry
+        yield '\n]}\n'
+    else:
+        raise ValueError(f"Unknown output format: {fmt}")
+
+def save_processed_lines(path, original_lines, processed_lines, fmt=None, chunk_size=WRITE_CHUNK):
+    """
+    Writes process_line results to path in fmt (by default chosen from the extension, see
+    LINE_FORMATS), straight from the line lists in chunks of chunk_size lines, replacing
+    path atomically.
+    """
+    lines = iter_formatted_lines(original_lines, processed_lines, fmt or format_for_path(path))
+    with atomic_open(path) as f:
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                break
+            f.writelines(chunk)
+
+def save_in_background(jobs, original_lines, processed_lines, on_done=None):
+    """
+    Runs save_processed_lines for every (path, fmt) in jobs on a background thread.
+    on_done(errors) is called on that thread with {path: exception} for the failed saves.
+    Returns the thread.
+    """
+    def run():
+        errors = {}
+        for path, fmt in jobs:
+            try:
+                save_processed_lines(path, original_lines, processed_lines, fmt)
+            except Exception as e:
+                errors[path] = e
+        if on_done:
+            on_done(errors)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a .ttml file to several formats in one pass.")
+    parser.add_argument('input', help=".ttml / .ttmf file (or Apple Music JSON)")
+    parser.add_argument('--lrc', help="syllabized LRC output")
+    parser.add_argument('--enhanced-lrc', help="word-timed (enhanced) LRC output")
+    parser.add_argument('--ultrastar', help="UltraStar TXT output")
+    parser.add_argument('--rocksmith', help="Rocksmith vocals XML output")
+    parser.add_argument('--json', help="timed syllable JSON output")
+    parser.add_argument('--jsonl', help="per-syllable records as JSON Lines")
+    parser.add_argument('--columns', help="per-syllable records as a binary columnar .lyc file")
+    parser.add_argument('--npy', help="folder for the per-syllable records as one NumPy .npy file per column (needs numpy)")
+    parser.add_argument('--parquet', help="per-syllable records as a Parquet file (needs pyarrow)")
+    parser.add_argument('-s', '--separator', default='+', help="syllable separator for the LRC output")
+    parser.add_argument('--per-syllable', action='store_true', help="time every syllable in the enhanced LRC output")
+    parser.add_argument('--beatmap', help="Rocksmith arrangement to snap the vocals to")
+    parser.add_argument('--offset', type=float, default=10.0, help="Rocksmith time offset in seconds")
+    parser.add_argument('--empty-measure', action='store_true', help="add the first measure to the Rocksmith offset")
+    parser.add_argument('--track', help="TTML track to export, e.g. body or transliteration:ja-Latn (default: first transliteration)")
+    parser.add_argument('--title', help="UltraStar title and song of the per-syllable records (default: input file name)")
+    parser.add_argument('--artist', default="", help="UltraStar artist")
+    args = parser.parse_args()
+
+    formats = ('lrc', 'enhanced_lrc', 'ultrastar', 'rocksmith', 'json') + RECORD_FORMATS
+    outputs = {fmt: getattr(args, fmt) for fmt in formats if getattr(args, fmt)}
+    if not outputs:
+        parser.error("choose at least one of --lrc, --enhanced-lrc, --ultrastar, --rocksmith, --json, "
+                     "--jsonl, --columns, --npy, --parquet")
+
+    data = syllabize.extract_ttml_data(args.input, args.track)
+    if not data:
+        print("No lyrics found in TTML file.")
+        return
+    title = args.title or os.path.splitext(os.path.basename(args.input))[0]
+    if export_song(data, outputs, args.separator, title, args.artist, args.offset, args.beatmap, args.empty_measure,
+                   args.per_syllable):
+        print(f"Exported {', '.join(outputs.values())}")
+
+if __name__ == "__main__":
+    main()
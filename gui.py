@@ -1,9 +1,14 @@
+import time
+# Reference point for the startup budget (time to first frame)
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
 import syllabize
 import os
 import sys
+import threading
 import webbrowser
 from config import Config
 
@@ -93,6 +98,9 @@ FONT_SUBHEADER = ("Segoe UI", 12)
 FONT_BOLD = ("Segoe UI", 10, "bold")
 FONT_ITALIC = ("Segoe UI", 9, "italic")
 
+# Files with more lines than this are processed on the worker pool
+PARALLEL_LINE_THRESHOLD = 2000
+
 class ToolTip(object):
     def __init__(self, widget, text='widget info'):
         self.widget = widget
@@ -121,6 +129,133 @@ class ToolTip(object):
             self.tooltip.destroy()
             self.tooltip = None
 
+class LazyText(scrolledtext.ScrolledText):
+    """
+    ScrolledText that keeps its lines in a list and renders only a window of them
+    (window_size lines around the view), however long the file is. The scrollbar is
+    mapped to the whole list, and the window moves along when the view gets close to
+    one of its edges or the scrollbar is dragged elsewhere. set_lines() patches changed
+    lines in place instead of replacing the whole widget content.
+    The widget is read-only unless editable is set; then the edited window is read back
+    into the list before the window moves, the lines are replaced or get_lines() is called.
+    """
+    WINDOW_SIZE = 600
+    # Fraction of the window left above/below the view before the window is moved
+    EDGE = 0.15
+
+    def __init__(self, master=None, window_size=None, editable=False, **kw):
+        super().__init__(master, **kw)
+        self.window_size = window_size or self.WINDOW_SIZE
+        self.idle_state = "normal" if editable else "disabled"
+        self.lines = []
+        # Model index of the first rendered line, and how many lines are rendered
+        self.top = 0
+        self.rendered = 0
+        self._move_pending = False
+        self.configure(yscrollcommand=self._on_yscroll, state=self.idle_state)
+        self.vbar.configure(command=self._on_scrollbar)
+
+    def _to_global(self, fraction):
+        """A yview fraction of the rendered window as a fraction of all lines"""
+        if not self.lines:
+            return fraction
+        return (self.top + float(fraction) * self.rendered) / len(self.lines)
+
+    def _on_yscroll(self, first, last):
+        self.vbar.set(self._to_global(first), self._to_global(last))
+        near_top = float(first) < self.EDGE and self.top > 0
+        near_end = float(last) > 1 - self.EDGE and self.top + self.rendered < len(self.lines)
+        if (near_top or near_end) and not self._move_pending:
+            self._move_pending = True
+            self.after_idle(self._recenter)
+
+    def _on_scrollbar(self, *args):
+        if args[0] != 'moveto' or not self.lines:
+            # Line and page steps scroll within the window, which follows via _on_yscroll
+            self.yview(*args)
+            return
+        line = min(int(float(args[1]) * len(self.lines)), len(self.lines) - 1)
+        self._show_line(max(0, line))
+
+    def _first_visible(self):
+        """Model index of the line at the top of the view"""
+        return self.top + int(self.index("@0,0").split('.')[0]) - 1
+
+    def _recenter(self):
+        self._move_pending = False
+        self._show_line(self._first_visible())
+
+    def _sync(self):
+        """Reads edits made in the rendered window back into the line list"""
+        if self.idle_state == "normal" and self.edit_modified():
+            edited = self.get(1.0, "end-1c").split("\n")
+            self.lines[self.top:self.top + self.rendered] = edited
+            self.rendered = len(edited)
+            self.edit_modified(False)
+
+    def get_lines(self):
+        """All lines, including edits made in the widget"""
+        self._sync()
+        return list(self.lines)
+
+    def _show_line(self, line):
+        """Scrolls model line line to the top of the view, moving the window around it if needed"""
+        self._sync()
+        top = max(0, min(line - self.window_size // 2, len(self.lines) - self.window_size))
+        if top != self.top:
+            self._render_window(top)
+        self.yview(f"{line - self.top + 1}.0")
+
+    def _render_window(self, top):
+        self.top = top
+        self.rendered = min(self.window_size, len(self.lines) - top)
+        self.configure(state="normal")
+        try:
+            self.delete(1.0, tk.END)
+            self.insert(1.0, "\n".join(self.lines[top:top + self.rendered]))
+        finally:
+            self.edit_modified(False)
+            self.configure(state=self.idle_state)
+
+    def set_lines(self, lines):
+        """Replace the model lines, patching only the rendered lines that changed"""
+        self._sync()
+        old_lines = self.lines
+        self.lines = list(lines)
+        self.configure(state="normal")
+        try:
+            self._patch(old_lines)
+        finally:
+            self.edit_modified(False)
+            self.configure(state=self.idle_state)
+
+    def _patch(self, old_lines):
+        top = max(0, min(self.top, len(self.lines) - self.window_size))
+        count = min(self.window_size, len(self.lines) - top)
+        if top != self.top or not self.rendered or not count:
+            self._render_window(top)
+            return
+
+        keep = min(self.rendered, count)
+        if self.rendered > count:
+            self.delete(f"{count}.end", "end-1c")
+
+        # Replace each run of consecutive changed lines with a single edit
+        i = 0
+        while i < keep:
+            if old_lines[top + i] == self.lines[top + i]:
+                i += 1
+                continue
+            start = i
+            while i < keep and old_lines[top + i] != self.lines[top + i]:
+                i += 1
+            self.delete(f"{start + 1}.0", f"{i}.end")
+            self.insert(f"{start + 1}.0", "\n".join(self.lines[top + start:top + i]))
+
+        if count > keep:
+            self.insert("end-1c", "\n" + "\n".join(self.lines[top + keep:top + count]))
+        self.rendered = count
+
 class TimedWarningDialog(tk.Frame):
     def __init__(self, parent, title, message, duration, config_key, config):
         super().__init__(parent)
@@ -188,8 +323,14 @@ class TimedWarningDialog(tk.Frame):
         self.destroy()
 
 class LRCApp(TkinterDnD.Tk):
-    def __init__(self):
+    def __init__(self, measure_startup=None):
+        """
+        measure_startup: report the time to the first frame and quit; the time is written
+        to this file, or printed if it is ''.
+        """
         super().__init__()
+        self.measure_startup = measure_startup
+        self.startup_seconds = None
         self.title("Lyridan")
         self.geometry("1000x700")
         self.minsize(900, 600)
@@ -212,6 +353,13 @@ class LRCApp(TkinterDnD.Tk):
         
         # Initialize config
         self.config = Config()
+        # The result cache is opened after the first frame, see get_result_cache
+        self.result_cache = None
+        self.result_cache_opened = False
+        self.result_cache_lock = threading.Lock()
+        self.watcher = None
+        # Thread of the last watcher stopped, which may still be finishing a file
+        self.stopping_watcher = None
         
         self.current_theme = self.config.get('theme', 'Dark')
         self.colors = THEMES[self.current_theme]
@@ -223,15 +371,66 @@ class LRCApp(TkinterDnD.Tk):
         self.container = tk.Frame(self, bg=self.colors["bg"])
         self.container.place(relx=0.5, rely=0.5, anchor="center", width=900, height=600)
         
+        # Frames are built the first time they are shown, only the landing page at startup
+        self.frame_classes = {F.__name__: F for F in (LandingPage, LRCFrame, RocksmithFrame, OptionsFrame)}
         self.frames = {}
-        
-        for F in (LandingPage, LRCFrame, RocksmithFrame, OptionsFrame):
-            page_name = F.__name__
-            frame = F(parent=self.container, controller=self)
-            self.frames[page_name] = frame
-            frame.place(relx=0, rely=0, relwidth=1, relheight=1)
             
         self.show_frame("LandingPage")
+        self.after_idle(self.on_first_frame)
+
+    def on_first_frame(self):
+        self.update_idletasks()
+        self.startup_seconds = time.perf_counter() - STARTED
+        if self.measure_startup is not None:
+            report = f"Time to first frame: {self.startup_seconds:.3f}s"
+            if self.measure_startup:
+                # A windowed build has no stdout, so the check reads the time from a file
+                with open(self.measure_startup, 'w', encoding='utf-8') as f:
+                    f.write(report + '\n')
+            else:
+                print(report)
+            self.destroy()
+            return
+        # Load pykakasi, the English dictionary and the result cache while the user picks a file
+        threading.Thread(target=self.warm_up, daemon=True).start()
+        if self.config.get('watch.enabled', False):
+            self.start_watching()
+
+    def warm_up(self):
+        syllabize.warm_up()
+        self.get_result_cache()
+
+    def get_result_cache(self):
+        """The on-disk result cache (None if it is disabled or unavailable), opened on first use"""
+        with self.result_cache_lock:
+            if not self.result_cache_opened:
+                import cache
+                self.result_cache = cache.open_default_cache(self.config)
+                self.result_cache_opened = True
+        return self.result_cache
+
+    def start_watching(self):
+        """Processes files dropped into the watched folders (watch.folders) in the background"""
+        import watch
+        self.stop_watching()
+        folders = [folder for folder in self.config.get('watch.folders', []) if os.path.isdir(folder)]
+        if folders:
+            self.watcher = watch.watcher_from_config(self.config, folders, self.get_result_cache())
+            # Begins once the previous watcher's last file is done
+            self.watcher.start(after=self.stopping_watcher)
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            # Don't hold up the window while a file finishes processing
+            self.stopping_watcher = self.watcher.stop(wait=False)
+            self.watcher = None
+
+    def get_frame(self, page_name):
+        if page_name not in self.frames:
+            frame = self.frame_classes[page_name](parent=self.container, controller=self)
+            frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+            self.frames[page_name] = frame
+        return self.frames[page_name]
         
     def apply_global_palette(self):
         self.tk_setPalette(
@@ -245,7 +444,7 @@ class LRCApp(TkinterDnD.Tk):
         )
 
     def show_frame(self, page_name, data=None):
-        frame = self.frames[page_name]
+        frame = self.get_frame(page_name)
         frame.tkraise()
         frame.update_theme(self.colors)
         if data:
@@ -374,6 +573,8 @@ class LRCFrame(tk.Frame):
         self.controller = controller
         self.current_file_path = None
         self.current_lines = []
+        self.processed_lines = []
+        self.save_thread = None
         
         self.top_bar = tk.Frame(self)
         self.top_bar.pack(fill="x", padx=20, pady=15)
@@ -393,13 +594,13 @@ class LRCFrame(tk.Frame):
         self.left_frame = tk.Frame(self.content_frame)
         self.left_frame.pack(side="left", fill="both", expand=True, padx=(0, 10))
         tk.Label(self.left_frame, text="Original", font=FONT_BOLD).pack(anchor="w", pady=(0, 5))
-        self.text_original = scrolledtext.ScrolledText(self.left_frame, width=40, height=20, font=("Consolas", 10), relief="flat", bd=0)
+        self.text_original = LazyText(self.left_frame, width=40, height=20, font=("Consolas", 10), relief="flat", bd=0)
         self.text_original.pack(fill="both", expand=True)
         
         self.right_frame = tk.Frame(self.content_frame)
         self.right_frame.pack(side="right", fill="both", expand=True, padx=(10, 0))
         tk.Label(self.right_frame, text="Syllabized", font=FONT_BOLD).pack(anchor="w", pady=(0, 5))
-        self.text_syllabized = scrolledtext.ScrolledText(self.right_frame, width=40, height=20, font=("Consolas", 10), relief="flat", bd=0)
+        self.text_syllabized = LazyText(self.right_frame, editable=True, width=40, height=20, font=("Consolas", 10), relief="flat", bd=0)
         self.text_syllabized.pack(fill="both", expand=True)
         
         self.controls_frame = tk.Frame(self)
@@ -452,33 +653,18 @@ class LRCFrame(tk.Frame):
         self.current_file_path = file_path
         self.save_btn.config(state="normal")
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                self.current_lines = content.splitlines()
-            self.text_original.delete(1.0, tk.END)
-            self.text_original.insert(tk.END, content)
+            # Pick up the lyridan_dictionary.txt overlay next to the file, if there is one
+            syllabize.set_project_dir(os.path.dirname(os.path.abspath(file_path)))
+            self.current_lines, info = syllabize.read_lrc_file(file_path)
+            self.text_original.set_lines(self.current_lines)
             
-            all_caps = True
-            has_text = False
-            for line in self.current_lines:
-                import re
-                match = re.match(r'^(\[.*?\])(.*)', line)
-                if match:
-                    text = match.group(2).strip()
-                    if text:
-                        has_text = True
-                        if not text[0].isupper():
-                            all_caps = False
-                            break
-            if has_text and all_caps:
+            if info['capitalized']:
                 self.capitalize_var.set(False)
                 self.cap_check.config(state="disabled")
             else:
                 self.cap_check.config(state="normal")
                 
-            sample_text = "".join(self.current_lines[:10])
-            lang = syllabize.detect_language(sample_text)
-            if lang == 'mixed':
+            if info['language'] == 'mixed':
                 messagebox.showwarning("Mixed Content", "Detected both Japanese and Russian characters. Processing might be inaccurate.")
             self.process_current_file()
         except Exception as e:
@@ -503,12 +689,14 @@ class LRCFrame(tk.Frame):
                 self.custom_sep_entry.insert(0, sep)
         romanize = self.romanize_var.get()
         capitalize = self.capitalize_var.get()
-        processed_lines = []
-        for line in self.current_lines:
-            processed = syllabize.process_line(line, separator=sep, romanize=romanize, capitalize=capitalize)
-            processed_lines.append(processed)
-        self.text_syllabized.delete(1.0, tk.END)
-        self.text_syllabized.insert(tk.END, "\n".join(processed_lines))
+        import cache
+        pool = None
+        if len(self.current_lines) > PARALLEL_LINE_THRESHOLD:
+            import workers
+            pool = workers.get_pool(self.controller.config)
+        self.processed_lines = cache.process_lines(self.current_lines, self.controller.get_result_cache(),
+                                                   separator=sep, romanize=romanize, capitalize=capitalize, pool=pool)
+        self.text_syllabized.set_lines(self.processed_lines)
 
     def save_file(self):
         if not self.current_file_path:
@@ -530,14 +718,31 @@ class LRCFrame(tk.Frame):
             self.wait_window(dialog)
         
         base = os.path.splitext(os.path.basename(self.current_file_path))[0]
-        output_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text Files", "*.txt")], initialfile=f"{base} Syllabized.txt")
+        output_path = filedialog.asksaveasfilename(defaultextension=".txt", initialfile=f"{base} Syllabized.txt",
+                                                   filetypes=[("Text Files", "*.txt"), ("Syllabized LRC", "*.lrc"), ("JSON", "*.json")])
         if output_path:
-            try:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(self.text_syllabized.get(1.0, tk.END))
-                messagebox.showinfo("Success", "File saved successfully!")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save file: {e}")
+            import exporters
+            # Saved on a background thread, with any corrections typed into the Syllabized pane
+            self.processed_lines = self.text_syllabized.get_lines()
+            self.save_btn.config(state="disabled", text="Saving...")
+            self.save_result = None
+            def done(errors):
+                self.save_result = errors
+            self.save_thread = exporters.save_in_background([(output_path, None)], self.current_lines,
+                                                            self.processed_lines, on_done=done)
+            self.after(100, self.check_save)
+
+    def check_save(self):
+        if self.save_thread.is_alive():
+            self.after(100, self.check_save)
+            return
+        self.save_thread = None
+        self.save_btn.config(state="normal", text="Save Output")
+        if self.save_result:
+            error = next(iter(self.save_result.values()))
+            messagebox.showerror("Error", f"Failed to save file: {error}")
+        else:
+            messagebox.showinfo("Success", "File saved successfully!")
 
     def open_options(self):
         self.controller.show_frame("OptionsFrame", data="LRCFrame")
@@ -547,6 +752,8 @@ class RocksmithFrame(tk.Frame):
         super().__init__(parent)
         self.controller = controller
         self.ttml_path = None
+        self.ttml_index = None
+        self.track_names = {}
         self.beatmap_path = None
         
         self.top_bar = tk.Frame(self)
@@ -568,6 +775,13 @@ class RocksmithFrame(tk.Frame):
         self.ttml_entry.pack(fill="x", pady=5)
         tk.Button(self.content_frame, text="Browse...", command=self.browse_ttml, font=FONT_MAIN, relief="flat", cursor="hand2").pack(anchor="e", pady=(0, 20))
         
+        tk.Label(self.content_frame, text="Lyrics Track:", font=FONT_BOLD).pack(anchor="w")
+        self.track_var = tk.StringVar(value="")
+        self.track_menu = tk.OptionMenu(self.content_frame, self.track_var, "")
+        self.track_menu.configure(font=FONT_MAIN, relief="flat", cursor="hand2")
+        self.track_menu.pack(anchor="w", pady=(5, 20))
+        ToolTip(self.track_menu, "Which lyrics in the file to export: the original lyrics, or one of the transliterations or translations it contains.")
+        
         tk.Label(self.content_frame, text="Rocksmith Arrangement File synced to the beat (eg. \"PART REAL_GUITAR_RS2.xml\"):", font=FONT_BOLD).pack(anchor="w")
         self.beatmap_entry = tk.Entry(self.content_frame, width=50, font=FONT_MAIN, relief="flat", bd=1)
         self.beatmap_entry.pack(fill="x", pady=5)
@@ -599,7 +813,7 @@ class RocksmithFrame(tk.Frame):
             try:
                 if isinstance(widget, (tk.Label, tk.Checkbutton)):
                     widget.configure(bg=colors["bg"], fg=colors["fg"], selectcolor=colors["bg"], activebackground=colors["bg"], activeforeground=colors["fg"])
-                elif isinstance(widget, tk.Button):
+                elif isinstance(widget, (tk.Button, tk.OptionMenu)):
                     widget.configure(bg=colors["btn_bg"], fg=colors["btn_fg"], activebackground=colors["btn_active_bg"], activeforeground=colors["btn_active_fg"])
                 elif isinstance(widget, tk.Entry):
                     widget.configure(bg=colors["entry_bg"], fg=colors["entry_fg"], insertbackground=colors["fg"],
@@ -614,6 +828,25 @@ class RocksmithFrame(tk.Frame):
         self.ttml_path = file_path
         self.ttml_entry.delete(0, tk.END)
         self.ttml_entry.insert(0, file_path)
+        self.load_tracks()
+
+    def load_tracks(self):
+        syllabize.set_project_dir(os.path.dirname(os.path.abspath(self.ttml_path)))
+        # Index every track once so switching tracks doesn't reparse the file
+        self.ttml_index = syllabize.index_ttml(self.ttml_path)
+        self.track_names = {}
+        menu = self.track_menu["menu"]
+        menu.delete(0, tk.END)
+        if self.ttml_index is None:
+            self.track_var.set("")
+            return
+        for name in self.ttml_index.track_names():
+            kind, _, lang = name.partition(':')
+            label = f"Original ({self.ttml_index.lang})" if kind == 'body' else f"{kind.capitalize()} ({lang})"
+            self.track_names[label] = name
+            menu.add_command(label=label, command=tk._setit(self.track_var, label))
+            if name == self.ttml_index.default_track():
+                self.track_var.set(label)
 
     def browse_ttml(self):
         path = filedialog.askopenfilename(filetypes=[("TTML Files", "*.ttml *.ttmf"), ("All Files", "*.*")])
@@ -641,7 +874,13 @@ class RocksmithFrame(tk.Frame):
             return
             
         try:
-            data = syllabize.extract_ttml_data(ttml)
+            if ttml != self.ttml_path or self.ttml_index is None:
+                self.ttml_path = ttml
+                self.load_tracks()
+            if self.ttml_index is None:
+                messagebox.showerror("Error", "Could not read the TTML file.")
+                return
+            data = self.ttml_index.spans(self.track_names.get(self.track_var.get()))
             if not data:
                 messagebox.showerror("Error", "No lyrics found in TTML file.")
                 return
@@ -705,6 +944,27 @@ class OptionsFrame(tk.Frame):
                                      command=self.reset_warnings, font=FONT_MAIN, relief="flat", cursor="hand2")
         self.reset_btn.pack(pady=10)
         
+        # Cache section
+        tk.Label(self.content_frame, text="Result Cache", font=FONT_BOLD).pack(pady=(20, 10))
+        self.clear_cache_btn = tk.Button(self.content_frame, text="Clear Result Cache",
+                                         command=self.clear_cache, font=FONT_MAIN, relief="flat", cursor="hand2")
+        self.clear_cache_btn.pack(pady=10)
+        
+        # Watch folder section
+        tk.Label(self.content_frame, text="Watch Folders", font=FONT_BOLD).pack(pady=(20, 10))
+        watch_row = tk.Frame(self.content_frame)
+        watch_row.pack()
+        self.watch_var = tk.BooleanVar(value=self.controller.config.get('watch.enabled', False))
+        tk.Checkbutton(watch_row, text="Process new files automatically", variable=self.watch_var,
+                       command=self.toggle_watch, font=FONT_MAIN).pack(side="left", padx=5)
+        tk.Button(watch_row, text="Add Folder", command=self.add_watch_folder, font=FONT_MAIN,
+                  relief="flat", cursor="hand2").pack(side="left", padx=5)
+        tk.Button(watch_row, text="Clear Folders", command=self.clear_watch_folders, font=FONT_MAIN,
+                  relief="flat", cursor="hand2").pack(side="left", padx=5)
+        self.watch_label = tk.Label(self.content_frame, font=FONT_ITALIC)
+        self.watch_label.pack()
+        self.update_watch_label()
+        
         # Footer with GitHub link
         footer_frame = tk.Frame(self.content_frame)
         footer_frame.pack(side="bottom", pady=20)
@@ -722,7 +982,7 @@ class OptionsFrame(tk.Frame):
         
         def update_recursive(widget):
             try:
-                if isinstance(widget, (tk.Label, tk.Radiobutton)):
+                if isinstance(widget, (tk.Label, tk.Radiobutton, tk.Checkbutton)):
                     # Preserve GitHub link color
                     if hasattr(widget, 'cget') and 'underline' in str(widget.cget('font')):
                         widget.configure(bg=colors["bg"])
@@ -751,9 +1011,51 @@ class OptionsFrame(tk.Frame):
     def reset_warnings(self):
         self.controller.config.reset_warnings()
         messagebox.showinfo("Success", "Warning acknowledgments have been reset.")
+    
+    def clear_cache(self):
+        result_cache = self.controller.get_result_cache()
+        if result_cache is not None:
+            result_cache.clear()
+        messagebox.showinfo("Success", "Result cache has been cleared.")
+
+    def update_watch_label(self):
+        folders = self.controller.config.get('watch.folders', [])
+        self.watch_label.configure(text="\n".join(folders) if folders else "No folders selected")
+
+    def toggle_watch(self):
+        self.controller.config.set('watch.enabled', self.watch_var.get())
+        if self.watch_var.get():
+            if not self.controller.config.get('watch.folders', []):
+                messagebox.showinfo("Watch Folders", "Add a folder to watch first.")
+            self.controller.start_watching()
+        else:
+            self.controller.stop_watching()
+
+    def add_watch_folder(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+        folders = self.controller.config.get('watch.folders', [])
+        if folder not in folders:
+            self.controller.config.set('watch.folders', folders + [folder])
+        self.update_watch_label()
+        if self.watch_var.get():
+            self.controller.start_watching()
+
+    def clear_watch_folders(self):
+        self.controller.config.set('watch.folders', [])
+        self.update_watch_label()
+        self.controller.stop_watching()
 
 if __name__ == "__main__":
-    app = LRCApp()
+    import multiprocessing
+    multiprocessing.freeze_support()
+    measure_startup = None
+    if '--measure-startup' in sys.argv:
+        # Optionally followed by the file to write the time to
+        report_args = sys.argv[sys.argv.index('--measure-startup') + 1:]
+        measure_startup = report_args[0] if report_args else ''
+    app = LRCApp(measure_startup=measure_startup)
     app.mainloop()
 
 
@@ -0,0 +1,167 @@
+"""
+Mora segmentation of Japanese kana.
+
+Lyrics are sung one mora per note, so kana are split into morae (a kana plus any small
+ゃゅょぁぃぅぇぉゎ after it, or a lone っ, ん or ー) and then grouped into syllables the way
+the LRC output has always written them: ん and a sokuon before a consonant close the
+syllable before them (かん, きっ|て), while long vowels (ー) keep their own note.
+Katakana are handled like hiragana and keep their original script.
+"""
+
+SMALL_KANA = 'ゃゅょぁぃぅぇぉゎ'
+SOKUON = 'っ'
+HATSUON = 'ん'
+CHOONPU = 'ー'
+
+# Katakana ァ..ヶ -> hiragana ぁ..ゖ, for str.translate
+HIRAGANA_TABLE = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+KANA = frozenset(chr(code) for code in range(0x3041, 0x3097)) | frozenset(map(chr, HIRAGANA_TABLE)) | {CHOONPU}
+
+def to_hiragana(text):
+    return text.translate(HIRAGANA_TABLE)
+
+def is_kana(char):
+    return char in KANA
+
+def _build_romaji():
+    rows = [
+        ('あいうえお', 'a i u e o'),
+        ('かきくけこ', 'ka ki ku ke ko'),
+        ('がぎぐげご', 'ga gi gu ge go'),
+        ('さしすせそ', 'sa shi su se so'),
+        ('ざじずぜぞ', 'za ji zu ze zo'),
+        ('たちつてと', 'ta chi tsu te to'),
+        ('だぢづでど', 'da ji zu de do'),
+        ('なにぬねの', 'na ni nu ne no'),
+        ('はひふへほ', 'ha hi fu he ho'),
+        ('ばびぶべぼ', 'ba bi bu be bo'),
+        ('ぱぴぷぺぽ', 'pa pi pu pe po'),
+        ('まみむめも', 'ma mi mu me mo'),
+        ('やゆよ', 'ya yu yo'),
+        ('らりるれろ', 'ra ri ru re ro'),
+        ('わゐゑを', 'wa i e wo'),
+        ('ゔゕゖ', 'vu ka ke'),
+        (SMALL_KANA, 'ya yu yo a i u e o wa'),
+        (HATSUON, 'n'),
+    ]
+    romaji = {}
+    for kana, readings in rows:
+        romaji.update(zip(kana, readings.split()))
+
+    # Contracted sounds: きゃ kya, しゃ sha, ちゃ cha, じゃ ja
+    for kana in 'きぎしじちぢにひびぴみり':
+        stem = romaji[kana][:-1]
+        for small, vowel in zip('ゃゅょ', 'auo'):
+            romaji[kana + small] = (stem if stem in ('sh', 'ch', 'j') else stem + 'y') + vowel
+    # Sounds written with small vowels, mostly in loanwords: ふぁ fa, てぃ ti, ヴぁ va
+    for kana, stem, smalls in (('ふ', 'f', 'ぁぃぇぉ'), ('ゔ', 'v', 'ぁぃぇぉ'), ('う', 'w', 'ぃぇぉ'),
+                               ('つ', 'ts', 'ぁぃぇぉ'), ('し', 'sh', 'ぇ'), ('ち', 'ch', 'ぇ'), ('じ', 'j', 'ぇ'),
+                               ('て', 't', 'ぃ'), ('で', 'd', 'ぃ'), ('と', 't', 'ぅ'), ('ど', 'd', 'ぅ'),
+                               ('い', 'y', 'ぇ'), ('く', 'kw', 'ぁ'), ('ぐ', 'gw', 'ぁ')):
+        for small in smalls:
+            romaji[kana + small] = stem + romaji[small]
+    for kana, stem in (('ふ', 'fy'), ('て', 'ty'), ('で', 'dy')):
+        romaji[kana + 'ゅ'] = stem + 'u'
+    return romaji
+
+ROMAJI = _build_romaji()
+
+def split_morae(text):
+    """
+    Splits kana into morae, keeping the original characters:
+    'きょうはラーメン' -> ['きょ', 'う', 'は', 'ラ', 'ー', 'メ', 'ン'].
+    """
+    morae = []
+    previous = ''
+    for char, hira in zip(text, to_hiragana(text)):
+        if morae and hira in SMALL_KANA and previous not in SMALL_KANA + SOKUON + HATSUON + CHOONPU:
+            morae[-1] += char
+        else:
+            morae.append(char)
+        previous = hira
+    return morae
+
+def mora_romaji(morae):
+    """
+    Hepburn romaji for each mora of split_morae(), or None if any mora isn't kana.
+    A sokuon doubles the next consonant (っち -> tch) and ー repeats the vowel before it.
+    """
+    hira_morae = [to_hiragana(mora) for mora in morae]
+    readings = []
+    for hira in hira_morae:
+        if hira == CHOONPU:
+            vowels = [c for c in readings[-1] if c in 'aeiou'] if readings else []
+            if not vowels:
+                return None
+            readings.append(vowels[-1])
+        elif hira == SOKUON or hira in ROMAJI:
+            readings.append(ROMAJI.get(hira, hira))
+        else:
+            return None
+
+    for m_idx, hira in enumerate(hira_morae):
+        if hira != SOKUON:
+            continue
+        if doubles_next(morae, m_idx):
+            following = readings[m_idx + 1]
+            readings[m_idx] = 't' if following.startswith('ch') else following[0]
+        else:
+            # Nothing to double (a final っ as in あっ!), read it like kakasi does
+            readings[m_idx] = 'tsu'
+    return readings
+
+def doubles_next(morae, m_idx):
+    """True if the mora at m_idx is a sokuon followed by a mora starting with a consonant"""
+    return (to_hiragana(morae[m_idx]) == SOKUON and m_idx + 1 < len(morae)
+            and to_hiragana(morae[m_idx + 1])[0] not in 'あいうえおやゆよわゐゑをん' + SMALL_KANA + SOKUON + CHOONPU)
+
+def joins_morae(text):
+    """False if group_syllables would leave every mora of text a syllable of its own (no ん or っ)"""
+    hira = to_hiragana(text)
+    return HATSUON in hira or SOKUON in hira
+
+def continues_word(previous, reading):
+    """
+    True if the kana reading can't start a word after the kana previous: previous ends in
+    a sokuon (which doubles the first consonant of reading), or reading starts with ん, っ,
+    ー or a small kana, which belong with the mora before them.
+    """
+    return (to_hiragana(previous[-1]) == SOKUON
+            or to_hiragana(reading[0]) in SMALL_KANA + SOKUON + HATSUON + CHOONPU)
+
+def group_syllables(morae, parts):
+    """
+    Joins parts (one per mora) into syllables: ん and a doubling っ close the syllable
+    before them, and a word-initial doubling っ (ってか) opens the syllable after it.
+    """
+    syllables = []
+    leading = ''
+    for m_idx, part in enumerate(parts):
+        hira = to_hiragana(morae[m_idx])
+        doubles = hira == SOKUON and doubles_next(morae, m_idx)
+        if syllables and (hira == HATSUON or doubles):
+            syllables[-1] += part
+        elif not syllables and not leading and doubles:
+            leading = part
+        else:
+            syllables.append(leading + part)
+            leading = ''
+    return syllables
+
+def syllables(text):
+    """Splits a run of kana into syllables, in the original script"""
+    morae = split_morae(text)
+    return group_syllables(morae, morae) if joins_morae(text) else morae
+
+def romaji_syllables(reading):
+    """
+    Romanizes a kana reading (such as a pykakasi token's 'hira') directly into romaji
+    syllables: 'がっこう' -> ['gak', 'ko', 'u']. Returns None if the reading isn't all kana.
+    """
+    if not reading or not KANA.issuperset(reading):
+        return None
+    morae = split_morae(reading)
+    readings = mora_romaji(morae)
+    if readings is None:
+        return None
+    return group_syllables(morae, readings) if joins_morae(reading) else readings
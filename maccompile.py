@@ -33,6 +33,11 @@ PyInstaller.__main__.run([
     f'--add-data=lyridanlogo.ico{sep}.', 
     '--hidden-import=syllabize',
     '--hidden-import=config',
+    '--hidden-import=cache',
+    '--hidden-import=workers',
+    '--hidden-import=dictionaries',
+    '--hidden-import=watch',
+    '--hidden-import=exporters',
     '--collect-all=tkinterdnd2',
     '--collect-all=pykakasi',
     '--collect-all=transliterate',
@@ -0,0 +1,207 @@
+import argparse
+import gc
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import syllabize
+from config import Config
+
+# One "typical song": 40 lyric lines, a mix of English and Japanese, 4 minutes long
+SONG_LINES = [
+    "I walk alone beneath the city lights",
+    "夢を見ていた 世界の果てで",
+    "Every heartbeat echoes through the night",
+    "君の声が聞こえる",
+    "Hold on, hold on, we're almost there",
+    "忘れないで この気持ちを",
+    "Running faster than the morning rain",
+    "大丈夫だよ ありがとう",
+] * 5
+SONG_LENGTH = 240.0
+
+# A doubling of input may cost at most 2 ** MAX_EXPONENT times as much
+MAX_EXPONENT = 1.25
+# Constant-memory (streaming) code paths may not grow memory faster than this
+MAX_STREAMING_EXPONENT = 0.5
+# Timings below this are too noisy to judge growth from
+MIN_MEASURABLE_SECONDS = 0.05
+MIN_MEASURABLE_BYTES = 256 * 1024
+
+def lrc_lines(scale):
+    lines = []
+    step = SONG_LENGTH / len(SONG_LINES)
+    for i in range(scale * len(SONG_LINES)):
+        lines.append(f"[{syllabize.format_lrc_time(i * step)}] {SONG_LINES[i % len(SONG_LINES)]}")
+    return lines
+
+def song_spans(scale):
+    """Yields extract_ttml_data-style spans for scale songs without building them all at once"""
+    step = SONG_LENGTH / len(SONG_LINES)
+    for i in range(scale * len(SONG_LINES)):
+        words = SONG_LINES[i % len(SONG_LINES)].split()
+        word_step = step / len(words)
+        for w_idx, word in enumerate(words):
+            start = i * step + w_idx * word_step
+            text = word + (' ' if w_idx < len(words) - 1 else '')
+            yield {'start': start, 'end': start + word_step, 'text': text, 'line_id': f"L{i + 1}"}
+
+def write_ttml(path, scale):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<tt xmlns="http://www.w3.org/ns/ttml" xmlns:itunes="http://music.apple.com/lyric-ttml-internal" xml:lang="ja">'
+                '<body><div>\n')
+        line_id = None
+        for span in song_spans(scale):
+            if span['line_id'] != line_id:
+                if line_id is not None:
+                    f.write('</p>\n')
+                line_id = span['line_id']
+                f.write(f'<p itunes:key="{line_id}">')
+            f.write(f'<span begin="{span["start"]:.3f}" end="{span["end"]:.3f}">{span["text"].strip()}</span>')
+            if span['text'].endswith(' '):
+                f.write(' ')
+        f.write('</p>\n</div></body></tt>\n')
+
+class Workload:
+    """One measured code path: setup(scale) prepares the input, run(prepared) does the work"""
+    def __init__(self, name, setup, run, streaming=False):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.streaming = streaming
+
+def make_workloads(workdir):
+    def setup_ttml(scale):
+        path = os.path.join(workdir, f"song_{scale}.ttml")
+        if not os.path.exists(path):
+            write_ttml(path, scale)
+        return path
+
+    def run_export(scale):
+        syllabize.export_rocksmith_xml(song_spans(scale), os.path.join(workdir, "vocals.xml"), offset=10.0)
+
+    return [
+        Workload("process_line",
+                 lrc_lines,
+                 lambda lines: [syllabize.process_line(line, romanize=True) for line in lines]),
+        Workload("extract_ttml_data", setup_ttml, syllabize.extract_ttml_data),
+        Workload("export_rocksmith_xml", lambda scale: scale, run_export, streaming=True),
+    ]
+
+def measure(workload, scale, top=5):
+    """Returns wall time, peak traced memory and the top allocation sites of one run"""
+    prepared = workload.setup(scale)
+
+    # Time without tracing, which would slow the run down several times
+    gc.collect()
+    start = time.perf_counter()
+    workload.run(prepared)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    result = workload.run(prepared)
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    sites = []
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        sites.append({
+            'site': f"{os.path.basename(frame.filename)}:{frame.lineno}",
+            'blocks': stat.count,
+            'bytes': stat.size,
+        })
+    return {'seconds': elapsed, 'peak_bytes': peak, 'sites': sites}
+
+def growth_exponent(small, large, scale_small, scale_large):
+    return math.log(large / small) / math.log(scale_large / scale_small)
+
+def check_growth(name, results, streaming):
+    """Returns failure messages for superlinear time or memory growth between consecutive scales"""
+    failures = []
+    scales = sorted(results)
+    for a, b in zip(scales, scales[1:]):
+        ra, rb = results[a], results[b]
+        if ra['seconds'] >= MIN_MEASURABLE_SECONDS:
+            exponent = growth_exponent(ra['seconds'], rb['seconds'], a, b)
+            if exponent > MAX_EXPONENT:
+                failures.append(f"{name}: time grows as n^{exponent:.2f} from {a}x to {b}x")
+        if ra['peak_bytes'] >= MIN_MEASURABLE_BYTES or streaming:
+            limit = MAX_STREAMING_EXPONENT if streaming else MAX_EXPONENT
+            exponent = growth_exponent(max(ra['peak_bytes'], 1), max(rb['peak_bytes'], 1), a, b)
+            if exponent > limit:
+                failures.append(f"{name}: peak memory grows as n^{exponent:.2f} from {a}x to {b}x (limit n^{limit})")
+    return failures
+
+def check_baseline(name, results, baseline, margin):
+    """Returns failure messages for results more than margin above the saved baseline"""
+    failures = []
+    for scale, result in results.items():
+        saved = baseline.get(name, {}).get(str(scale))
+        if not saved:
+            continue
+        for key, unit, minimum in (('seconds', 's', MIN_MEASURABLE_SECONDS), ('peak_bytes', ' bytes', MIN_MEASURABLE_BYTES)):
+            if saved[key] >= minimum and result[key] > saved[key] * (1 + margin):
+                failures.append(f"{name} {scale}x: {key} {result[key]:.3f}{unit} exceeds baseline "
+                                f"{saved[key]:.3f}{unit} by more than {margin:.0%}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how Lyridan scales from 1x to 1000x a typical song.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000], help="input sizes, in songs")
+    parser.add_argument('--only', nargs='+', help="workloads to run (default: all)")
+    parser.add_argument('--baseline', default=os.path.join(Config().config_dir, 'scaling_baseline.json'),
+                        help="baseline results to compare against")
+    parser.add_argument('--margin', type=float, default=0.25, help="allowed slowdown/growth over the baseline (0.25 = 25%%)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--sites', type=int, default=5, help="allocation sites to report per workload")
+    args = parser.parse_args()
+
+    syllabize.warm_up()
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    failures = []
+    all_results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for workload in make_workloads(workdir):
+            if args.only and workload.name not in args.only:
+                continue
+            results = {}
+            print(f"\n{workload.name}")
+            print(f"{'scale':>7} {'time (s)':>10} {'peak (KB)':>11}")
+            for scale in sorted(args.scales):
+                results[scale] = measure(workload, scale, args.sites)
+                print(f"{scale:>6}x {results[scale]['seconds']:>10.3f} {results[scale]['peak_bytes'] // 1024:>11}")
+            largest = results[max(results)]
+            print(f"  top allocation sites at {max(results)}x:")
+            for site in largest['sites']:
+                print(f"    {site['site']:<28} {site['blocks']:>9} blocks {site['bytes'] // 1024:>9} KB")
+
+            failures += check_growth(workload.name, results, workload.streaming)
+            failures += check_baseline(workload.name, results, baseline, args.margin)
+            all_results[workload.name] = {str(scale): result for scale, result in results.items()}
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll scaling checks passed.")
+
+if __name__ == "__main__":
+    main()
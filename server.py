@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cache
+import syllabize
+from config import Config
+
+DEFAULT_PORT = 8765
+# Host headers the HTTP server answers to, besides the address it listens on. Anything else
+# is a page in the browser reaching the service through a rebound DNS name.
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+class UnknownMethodError(Exception):
+    pass
+
+class ForbiddenError(Exception):
+    pass
+
+class LyridanService:
+    """
+    Keeps the dictionary, romanizer and result cache loaded and answers JSON requests.
+    At most max_concurrency requests are processed at once; further requests wait
+    for a free slot. Files named in requests must be inside root (default: the home
+    folder), and exports only write .xml files.
+    """
+    def __init__(self, result_cache=None, max_concurrency=None, root=None):
+        syllabize.warm_up()
+        self.root = os.path.realpath(root or os.path.expanduser('~'))
+        self.result_cache = result_cache
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.stats_lock = threading.Lock()
+        self.started = time.time()
+        self.in_flight = 0
+        self.method_stats = {}
+        self.methods = {
+            'process_line': self.process_line,
+            'process_text': self.process_text,
+            'extract_ttml': self.extract_ttml,
+            'ttml_tracks': self.ttml_tracks,
+            'export_rocksmith': self.export_rocksmith,
+            'health': self.health,
+            'stats': self.stats,
+        }
+
+    def handle(self, method, params):
+        """Runs one request and returns its result, raising UnknownMethodError/ValueError for bad requests"""
+        if method not in self.methods:
+            raise UnknownMethodError(f"Unknown method: {method}")
+        if not isinstance(params, dict):
+            raise ValueError("params must be a JSON object")
+        # Health and stats must answer even while every slot is busy
+        if method in ('health', 'stats'):
+            return self.methods[method](params)
+
+        start = time.perf_counter()
+        error = False
+        with self.slots:
+            with self.stats_lock:
+                self.in_flight += 1
+            try:
+                return self.methods[method](params)
+            except Exception:
+                error = True
+                raise
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                with self.stats_lock:
+                    self.in_flight -= 1
+                    entry = self.method_stats.setdefault(method, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+                    entry['count'] += 1
+                    entry['errors'] += error
+                    entry['total_ms'] += elapsed
+                    entry['max_ms'] = max(entry['max_ms'], elapsed)
+
+    def _options(self, params):
+        return {
+            'separator': params.get('separator', '+'),
+            'romanize': bool(params.get('romanize', False)),
+            'capitalize': bool(params.get('capitalize', False)),
+            'language_override': params.get('language_override'),
+        }
+
+    def process_line(self, params):
+        if 'line' not in params:
+            raise ValueError("Missing 'line'")
+        if not isinstance(params['line'], str):
+            raise ValueError("'line' must be a string")
+        return {'result': syllabize.process_line(params['line'], **self._options(params))}
+
+    def process_text(self, params):
+        if 'lines' in params:
+            lines = params['lines']
+            if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+                raise ValueError("'lines' must be a list of strings")
+        elif 'text' in params:
+            if not isinstance(params['text'], str):
+                raise ValueError("'text' must be a string")
+            lines = params['text'].splitlines()
+        else:
+            raise ValueError("Missing 'text' or 'lines'")
+        return {'lines': cache.process_lines(lines, self.result_cache, **self._options(params))}
+
+    def _path(self, params, key, extension=None):
+        """params[key] as a real path inside root (and ending in extension, if given)"""
+        value = params[key]
+        if not isinstance(value, str) or not value:
+            raise ValueError(f"'{key}' must be a path")
+        path = os.path.realpath(value)
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ForbiddenError(f"'{key}' is outside {self.root}")
+        if extension and not path.lower().endswith(extension):
+            raise ForbiddenError(f"'{key}' must be a {extension} file")
+        return path
+
+    def _ttml_index(self, params):
+        if 'content' in params:
+            return syllabize.index_ttml_text(params['content'])
+        if 'path' in params:
+            with open(self._path(params, 'path'), 'r', encoding='utf-8') as f:
+                return syllabize.index_ttml_text(f.read())
+        raise ValueError("Missing 'content' or 'path'")
+
+    def extract_ttml(self, params):
+        return {'data': self._ttml_index(params).spans(params.get('track'))}
+
+    def ttml_tracks(self, params):
+        index = self._ttml_index(params)
+        return {
+            'tracks': index.track_names(),
+            'default': index.default_track(),
+            'lines': index.aligned(params.get('tracks')),
+        }
+
+    def export_rocksmith(self, params):
+        if 'output_path' not in params:
+            raise ValueError("Missing 'output_path'")
+        output_path = self._path(params, 'output_path', '.xml')
+        beatmap_path = self._path(params, 'beatmap_path') if params.get('beatmap_path') else None
+        if 'data' in params:
+            data = params['data']
+        elif 'ttml_path' in params:
+            data = syllabize.extract_ttml_data(self._path(params, 'ttml_path'), params.get('track'))
+        else:
+            raise ValueError("Missing 'data' or 'ttml_path'")
+        success = syllabize.export_rocksmith_xml(
+            data, output_path,
+            offset=float(params.get('offset', 10.0)),
+            beatmap_path=beatmap_path,
+            empty_measure=bool(params.get('empty_measure', False))
+        )
+        return {'success': success}
+
+    def health(self, params):
+        return {'status': 'ok'}
+
+    def stats(self, params):
+        with self.stats_lock:
+            methods = {}
+            for name, entry in self.method_stats.items():
+                methods[name] = dict(entry, avg_ms=entry['total_ms'] / entry['count'])
+            result = {
+                'uptime': time.time() - self.started,
+                'in_flight': self.in_flight,
+                'max_concurrency': self.max_concurrency,
+                'methods': methods,
+            }
+        if self.result_cache is not None:
+            result['cache_size'] = self.result_cache.total_size
+        return result
+
+class HTTPHandler(BaseHTTPRequestHandler):
+    """
+    POST /<method> with a JSON object body; GET /health and /stats.
+    Only local clients that aren't browsers are answered: requests with an Origin header
+    or a Host the server doesn't know are refused, and POST bodies must be sent as
+    application/json, which a web page can't do without the Origin header.
+    """
+    server_version = "Lyridan"
+
+    def check_client(self):
+        """Sends 403 and returns False if the request may come from a web page"""
+        host = self.headers.get('Host', '')
+        host = host[1:host.find(']')] if host.startswith('[') else host.rsplit(':', 1)[0]
+        if self.headers.get('Origin') is not None:
+            self.send_json(403, {'error': "Cross-origin requests are not allowed"})
+            return False
+        if host.lower() not in self.server.allowed_hosts:
+            self.send_json(403, {'error': f"Unknown Host: {host}"})
+            return False
+        return True
+
+    def do_GET(self):
+        if self.check_client():
+            self.dispatch(self.path.strip('/'), {})
+
+    def do_POST(self):
+        if not self.check_client():
+            return
+        if self.headers.get_content_type() != 'application/json':
+            self.send_json(415, {'error': "Content-Type must be application/json"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self.send_json(400, {'error': f"Invalid JSON: {e}"})
+            return
+        self.dispatch(self.path.strip('/'), params)
+
+    def dispatch(self, method, params):
+        try:
+            self.send_json(200, self.server.service.handle(method, params))
+        except UnknownMethodError as e:
+            self.send_json(404, {'error': str(e)})
+        except ForbiddenError as e:
+            self.send_json(403, {'error': str(e)})
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class SocketHandler(socketserver.StreamRequestHandler):
+    """
+    One JSON request per line: {"id": ..., "method": ..., "params": {...}}.
+    Each response is one line with the same id and either "result" or "error".
+    """
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
+            request_id = None
+            try:
+                request = json.loads(raw)
+                request_id = request.get('id')
+                result = self.server.service.handle(request.get('method'), request.get('params', {}))
+                response = {'id': request_id, 'result': result}
+            except Exception as e:
+                response = {'id': request_id, 'error': str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+class HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, HTTPHandler)
+        self.service = service
+        self.allowed_hosts = LOCAL_HOSTS | {address[0].lower()}
+
+def remove_socket(path):
+    """Removes a Unix socket left at path; refuses to touch any other kind of file"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} exists and is not a socket")
+    os.remove(path)
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class UnixSocketServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, path, service):
+            remove_socket(path)
+            super().__init__(path, SocketHandler)
+            self.service = service
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Lyridan as a local JSON service.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on for HTTP")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="HTTP port")
+    parser.add_argument('--socket', help="listen on this Unix socket instead of HTTP")
+    parser.add_argument('--max-concurrency', type=int, help="requests processed at once (default: one per core)")
+    parser.add_argument('--root', help="folder that files named in requests must be in (default: your home folder)")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the result cache")
+    args = parser.parse_args()
+
+    result_cache = None if args.no_cache else cache.open_default_cache(Config())
+    service = LyridanService(result_cache, args.max_concurrency, args.root)
+
+    if args.socket:
+        if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+            parser.error("Unix sockets are not supported on this platform")
+        try:
+            server = UnixSocketServer(args.socket, service)
+        except FileExistsError as e:
+            parser.error(str(e))
+        print(f"Lyridan service listening on {args.socket}")
+    else:
+        server = HTTPServer((args.host, args.port), service)
+        print(f"Lyridan service listening on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            remove_socket(args.socket)
+
+if __name__ == "__main__":
+    main()
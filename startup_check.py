@@ -0,0 +1,82 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_FRAME_RE = re.compile(r'Time to first frame: ([\d.]+)s')
+
+def measure_import(module):
+    """Seconds a fresh interpreter needs to import module"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"import {module} failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+def measure_first_frame(command):
+    """
+    Launches the app with --measure-startup and returns (in-process seconds, wall seconds)
+    until the landing page is drawn, or None if no display is available.
+    The app writes its time to a report file rather than stdout, which a windowed
+    (--windowed PyInstaller) build doesn't have.
+    """
+    fd, report_path = tempfile.mkstemp(prefix='lyridan-startup-', suffix='.txt')
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        result = subprocess.run(command + ['--measure-startup', report_path], cwd=HERE,
+                                capture_output=True, text=True, timeout=120)
+        wall = time.perf_counter() - start
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = f.read()
+    finally:
+        os.remove(report_path)
+    match = FIRST_FRAME_RE.search(report)
+    if match:
+        return float(match.group(1)), wall
+    if 'TclError' in result.stderr and 'display' in result.stderr:
+        return None
+    raise RuntimeError(result.stderr.strip() or "the app did not report its startup time")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Lyridan's startup time against a budget.")
+    parser.add_argument('--budget', type=float, default=1.0, help="seconds allowed until the first frame is drawn")
+    parser.add_argument('--import-budget', type=float, default=0.3, help="seconds allowed to import syllabize")
+    parser.add_argument('--app', help="packaged executable to measure instead of gui.py")
+    parser.add_argument('--runs', type=int, default=3, help="runs per measurement; the fastest counts")
+    parser.add_argument('--require-gui', action='store_true', help="fail instead of skipping when there is no display")
+    args = parser.parse_args()
+
+    failures = []
+
+    import_time = min(measure_import('syllabize') for _ in range(args.runs))
+    print(f"import syllabize: {import_time:.3f}s (budget {args.import_budget:.3f}s)")
+    if import_time > args.import_budget:
+        failures.append(f"importing syllabize took {import_time:.3f}s, over the {args.import_budget:.3f}s budget")
+
+    command = [args.app] if args.app else [sys.executable, os.path.join(HERE, 'gui.py')]
+    measurements = [measure_first_frame(command) for _ in range(args.runs)]
+    if None in measurements:
+        print("first frame: skipped, no display available")
+        if args.require_gui:
+            failures.append("no display available to measure the first frame")
+    else:
+        first_frame, wall = min(measurements)
+        print(f"first frame: {first_frame:.3f}s in process, {wall:.3f}s including interpreter start (budget {args.budget:.3f}s)")
+        if first_frame > args.budget:
+            failures.append(f"first frame took {first_frame:.3f}s, over the {args.budget:.3f}s budget")
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nStartup is within budget.")
+
+if __name__ == "__main__":
+    main()
@@ -2,48 +2,306 @@ import re
 import json
 import xml.etree.ElementTree as ET
 import os
+import codecs
+import threading
+import itertools
+import contextlib
+import contextvars
+import functools
 
-# Try to import pykakasi for Japanese romanization
-kks = None
-try:
-    from pykakasi import kakasi
-    kks = kakasi()
-    kks.setMode('H', 'a')
-    kks.setMode('K', 'a')
-    kks.setMode('J', 'a')
-except ImportError:
-    pass
+import kana
 
-# Load English syllabification dictionary
-english_dict = {}
-try:
-    dict_path = os.path.join(os.path.dirname(__file__), 'English.txt')
-    if os.path.exists(dict_path):
-        with open(dict_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and '•' in line:
-                    # Store as lowercase key -> syllabified value
-                    english_dict[line.replace('•', '').lower()] = line
-except Exception as e:
-    print(f"Warning: Could not load English.txt: {e}")
-
-# Try to import transliterate for Russian
-HAS_TRANSLITERATE = False
-try:
-    from transliterate import translit
-    HAS_TRANSLITERATE = True
-except ImportError:
-    pass
+# Bump whenever a change alters the text process_line produces, so cached results
+# from older versions are not reused
+PROCESSING_VERSION = 3
+
+# pykakasi, transliterate and the English dictionaries are loaded on first use, so importing this module
+# stays fast (the GUI imports it before its window appears). They belong to an EngineResources,
+# which any number of LyridanEngine objects can share; the module functions below use the
+# engine that is currently running (see current_engine), normally the default one. The
+# per-word functions take what they look words up in as arguments instead, resolved once per
+# line or batch (see EngineResources.line_tables), so no lookup runs per word. The old
+# module attributes kks, english_dict, english_dict_version, translit and HAS_TRANSLITERATE
+# still work through __getattr__ below.
+#
+# Everything here may be called from many threads at once. Each thread gets its own
+# kakasi converter (they share pykakasi's dictionary tables, which load once), the
+# dictionaries are read without locks (see dictionaries.LayeredDictionary) and the
+# lazy loading is guarded by each EngineResources' lock.
+class EngineResources:
+    """
+    The expensive, read-only data processing needs: pykakasi, transliterate and the
+    English dictionaries. Nothing is loaded until it is first used or warm_up() is called.
+
+    dictionaries is a dictionaries.LayeredDictionary (or anything with its interface), or
+    the path of a dictionary file in the English.txt format to use on its own. By default
+    it is English.txt under the user's overlays in <config dir>/dictionaries, held in a plain
+    dict (worker processes switch to a shared, memory-mapped index, see use_index).
+    """
+    def __init__(self, dictionaries=None):
+        self.lock = threading.RLock()
+        self.thread_state = threading.local()
+        self.default_dictionaries = dictionaries is None
+        self.indexed = False
+        self._inherited_dictionaries = None
+        if dictionaries is None or isinstance(dictionaries, (str, os.PathLike)):
+            self.dictionary_path, self._dictionaries = dictionaries, None
+        else:
+            self.dictionary_path, self._dictionaries = None, dictionaries
+        self._kakasi_class = None
+        self._kakasi_loaded = False
+        self._translit = None
+        self._translit_loaded = False
+
+    def kakasi_class(self):
+        if not self._kakasi_loaded:
+            with self.lock:
+                if not self._kakasi_loaded:
+                    # Try to import pykakasi for Japanese romanization
+                    try:
+                        from pykakasi import kakasi
+                        self._kakasi_class = kakasi
+                    except ImportError:
+                        pass
+                    self._kakasi_loaded = True
+        return self._kakasi_class
+
+    def kakasi(self):
+        """Returns this thread's pykakasi converter, or None if pykakasi is not installed"""
+        kks = getattr(self.thread_state, 'kks', None)
+        if kks is None:
+            kakasi = self.kakasi_class()
+            if kakasi is None:
+                return None
+            kks = kakasi()
+            kks.setMode('H', 'a')
+            kks.setMode('K', 'a')
+            kks.setMode('J', 'a')
+            self.thread_state.kks = kks
+        return kks
+
+    def dictionaries(self):
+        """Returns the LayeredDictionary words are looked up in, loading it on first use"""
+        if self._dictionaries is None:
+            with self.lock:
+                if self._dictionaries is None:
+                    self._dictionaries = _load_dictionaries(self.dictionary_path, self.indexed)
+        return self._dictionaries
+
+    def compile_index(self):
+        """Compiles the index use_index reads, if it isn't up to date, so workers don't all compile it"""
+        if self.default_dictionaries:
+            import dictionaries
+            base_path, user_dir, index_dir = _dictionary_paths()
+            if index_dir:
+                dictionaries.open_index(base_path, index_dir)
+
+    def use_index(self):
+        """
+        Looks the default dictionary up in its compiled, memory-mapped index from now on
+        (see dictionaries.DictionaryIndex). Worker processes call this, so they all read one
+        copy in the OS page cache instead of each building a dict of their own.
+        """
+        with self.lock:
+            if self.default_dictionaries and not self.indexed:
+                self.indexed = True
+                # A dictionary inherited from a forked parent is kept: freeing it would
+                # write to every page it is on, copying them into this process
+                self._inherited_dictionaries, self._dictionaries = self._dictionaries, None
+
+    def translit(self):
+        """Returns transliterate's translit function for Russian, or None if it is not installed"""
+        if not self._translit_loaded:
+            with self.lock:
+                if not self._translit_loaded:
+                    try:
+                        from transliterate import translit
+                        self._translit = translit
+                    except ImportError:
+                        pass
+                    self._translit_loaded = True
+        return self._translit
+
+    def line_tables(self, romanize=False):
+        """
+        What _process_line looks words up in, resolved once for a line or a batch of lines:
+        (English dictionary, this thread's kakasi converter, translit). The romanizers are
+        only loaded with romanize, and are None without it or if they aren't installed.
+        """
+        if romanize:
+            return self.dictionaries().current(), self.kakasi(), self.translit()
+        return self.dictionaries().current(), None, None
+
+    def warm_up(self):
+        """
+        Loads everything now, so the first real call does not pay for it (pykakasi
+        loads its dictionary tables on the first conversion). Loads in this thread's
+        kakasi converter; other threads still build their own on first use.
+        """
+        kks = self.kakasi()
+        if kks:
+            kks.convert('漢字かなカナ')
+        self.translit()
+        self.dictionaries().current()
+
+def _dictionary_paths():
+    """(English.txt, the user overlay folder, the index folder); the folders are None if there is no config dir"""
+    from config import Config
+    base_path = os.path.join(os.path.dirname(__file__), 'English.txt')
+    try:
+        config_dir = Config().config_dir
+        return base_path, os.path.join(config_dir, 'dictionaries'), os.path.join(config_dir, 'index')
+    except Exception as e:
+        print(f"Warning: Could not find the user dictionary folder: {e}")
+        return base_path, None, None
+
+def _load_dictionaries(path=None, indexed=False):
+    import dictionaries
+    if path is not None:
+        return dictionaries.LayeredDictionary(path)
+    base_path, user_dir, index_dir = _dictionary_paths()
+    return dictionaries.LayeredDictionary(base_path, user_dir, index_dir if indexed else None)
+
+_default_lock = threading.Lock()
+_default_resources = None
+_default_engine = None
+# The engine whose method is running in this thread (or asyncio task), if any
+_active_engine = contextvars.ContextVar('lyridan_engine', default=None)
+
+def default_resources():
+    """The EngineResources the module functions and worker processes use"""
+    global _default_resources
+    if _default_resources is None:
+        with _default_lock:
+            if _default_resources is None:
+                _default_resources = EngineResources()
+    return _default_resources
+
+def default_engine():
+    """The LyridanEngine behind the module functions: default resources and options, no result cache"""
+    global _default_engine
+    if _default_engine is None:
+        resources = default_resources()
+        with _default_lock:
+            if _default_engine is None:
+                _default_engine = LyridanEngine(resources)
+    return _default_engine
+
+def current_engine():
+    """The engine running in this thread (inside one of its methods or active()), else the default engine"""
+    return _active_engine.get() or default_engine()
+
+def get_kakasi():
+    """Returns this thread's pykakasi converter, or None if pykakasi is not installed"""
+    return current_engine().resources.kakasi()
+
+def get_dictionaries():
+    """
+    Returns the LayeredDictionary behind get_english_dict: by default English.txt under
+    the user's overlays in <config dir>/dictionaries and the current project's overlay.
+    """
+    return current_engine().resources.dictionaries()
+
+def get_english_dict():
+    """Returns the English syllabification dictionary: lowercase word -> syllabified word"""
+    return get_dictionaries().current()
+
+def get_english_dict_version():
+    """Fingerprint of every dictionary layer in use, for cache keys"""
+    layered = get_dictionaries()
+    layered.refresh()
+    return layered.version
+
+def set_project_dir(project_dir):
+    """
+    Adds the dictionary overlay of the folder being worked in (see dictionaries.PROJECT_DICTIONARY).
+    The setting is per thread, so threads working on different folders don't interfere.
+    """
+    get_dictionaries().set_project_dir(project_dir)
+
+def get_project_dir():
+    return get_dictionaries().project_dir()
+
+def get_translit():
+    """Returns transliterate's translit function for Russian, or None if it is not installed"""
+    return current_engine().resources.translit()
+
+def __getattr__(name):
+    if name == 'kks':
+        return get_kakasi()
+    if name == 'english_dict':
+        return get_english_dict()
+    if name == 'english_dict_version':
+        return get_english_dict_version()
+    if name == 'translit':
+        return get_translit()
+    if name == 'HAS_TRANSLITERATE':
+        return get_translit() is not None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_romanizer_version = None
+
+def romanizer_version():
+    """
+    Identifies the processing code and romanizer packages that produced a result.
+    Looked up once per process, since the installed packages don't change while it runs.
+    """
+    global _romanizer_version
+    if _romanizer_version is None:
+        # importlib.metadata takes ~30 ms to import, so it is only loaded when needed
+        from importlib import metadata
+        versions = [f"lyridan-{PROCESSING_VERSION}"]
+        for package in ('pykakasi', 'transliterate'):
+            try:
+                versions.append(f"{package}-{metadata.version(package)}")
+            except metadata.PackageNotFoundError:
+                versions.append(f"{package}-none")
+        _romanizer_version = ' '.join(versions)
+    return _romanizer_version
+
+JAPANESE_RE = re.compile(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]')
+RUSSIAN_RE = re.compile(r'[а-яА-Я]')
+LRC_LINE_RE = re.compile(r'^(\[.*?\])(.*)')
+WORD_PUNCTUATION_RE = re.compile(r'^([^\w]*)(.*?)([^\w]*)$')
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Byte order marks, longest first so UTF-32 LE isn't mistaken for UTF-16 LE
+BOM_ENCODINGS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Accented letters of Western European text in cp1252
+WESTERN_RE = re.compile(r'[\u00C0-\u00D6\u00D8-\u00F6\u00F8-\u00FF]')
+
+# Legacy encodings tried when a file is not UTF-8, with the characters that count
+# as evidence for each of them and the share of all decoded letters they must make up.
+# Any accented Latin byte is a letter in cp1251 too, so it needs mostly Cyrillic text.
+LEGACY_ENCODINGS = [
+    ('cp932', JAPANESE_RE, 0),
+    ('shift_jis', JAPANESE_RE, 0),
+    ('cp1251', RUSSIAN_RE, 0.5),
+    ('cp1252', WESTERN_RE, 0),
+]
+
+def warm_up():
+    """
+    Makes sure the romanizer and dictionary are ready, so the first real call
+    does not pay for pykakasi's lazy dictionary loading.
+    """
+    current_engine().warm_up()
 
 def detect_language(text):
     """
     Simple heuristic to detect language based on character sets.
     Returns: 'japanese', 'russian', 'mixed', or 'other'
     """
-    has_japanese = bool(re.search(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]', text))
-    has_russian = bool(re.search(r'[а-яА-Я]', text))
-    
+    return language_from_flags(bool(JAPANESE_RE.search(text)), bool(RUSSIAN_RE.search(text)))
+
+def language_from_flags(has_japanese, has_russian):
     if has_japanese and has_russian:
         return 'mixed'
     elif has_japanese:
@@ -52,175 +310,498 @@ def detect_language(text):
         return 'russian'
     return 'other'
 
-def ttml_time_to_seconds(ttml_time):
+def detect_encoding(sample, exclude=()):
     """
-    Converts TTML time string to seconds (float).
-    TTML: "20.501" (seconds) or "1:00.233" (mm:ss.ms)
+    Guesses the text encoding of a file from its first bytes.
+    Checks for a BOM, then strict UTF-8, then the legacy encodings, picking the
+    one that decodes the most Japanese/Cyrillic/accented Latin characters.
+    Encodings in exclude (e.g. ones that already failed further into the file) are skipped.
     """
-    try:
-        if ':' in ttml_time:
-            parts = ttml_time.split(':')
-            if len(parts) == 2:
-                m, s = parts
-                return int(m) * 60 + float(s)
-            elif len(parts) == 3:
-                h, m, s = parts
-                return int(h) * 3600 + int(m) * 60 + float(s)
-            else:
-                return 0.0
+    for bom, encoding in BOM_ENCODINGS:
+        if sample.startswith(bom) and encoding not in exclude:
+            return encoding
+    
+    if 'utf-8' not in exclude:
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+    
+    best_encoding = None
+    best_score = -1
+    for encoding, evidence_re, min_share in LEGACY_ENCODINGS:
+        if encoding in exclude:
+            continue
+        try:
+            text = codecs.getincrementaldecoder(encoding)().decode(sample)
+        except UnicodeDecodeError:
+            continue
+        score = len(evidence_re.findall(text))
+        if min_share and score <= min_share * sum(c.isalpha() for c in text):
+            continue
+        if score > best_score:
+            best_encoding = encoding
+            best_score = score
+    
+    # latin-1 decodes any byte sequence, so loading never fails outright
+    return best_encoding or 'latin-1'
+
+def read_lrc_file(file_path, encoding=None, chunk_size=65536):
+    """
+    Reads an .lrc file in chunks and returns (lines, info).
+    The encoding is sniffed from the first chunk unless given. info holds the
+    'encoding' used, whether every lyric line is 'capitalized' and the 'language'
+    of the whole file, all gathered in the same pass over the lines.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(chunk_size)
+        guessed = encoding is None
+        if guessed:
+            encoding = detect_encoding(head)
+        
+        failed = set()
+        while True:
+            try:
+                return _read_lrc_stream(f, head, encoding, chunk_size)
+            except UnicodeDecodeError:
+                if not guessed:
+                    raise
+                failed.add(encoding)
+            # The first chunk decoded fine but a later one did not, guess again
+            f.seek(0)
+            head = f.read(chunk_size)
+            encoding = detect_encoding(head, exclude=failed)
+
+def _decode_lines(f, head, encoding, chunk_size):
+    """Yields the lines of f decoded chunk by chunk; head is the first chunk, already read"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    chunk = head
+    while True:
+        final = not chunk
+        text = pending + decoder.decode(chunk, final=final)
+        
+        if final:
+            complete, pending = text, ''
         else:
-            return float(ttml_time)
-    except:
-        return 0.0
+            # Keep the unfinished last line (and a trailing \r that may be half of \r\n)
+            cut = max(text.rfind('\n'), text.rfind('\r', 0, len(text) - 1))
+            complete, pending = text[:cut + 1], text[cut + 1:]
+        
+        yield from complete.splitlines()
+        
+        if final:
+            break
+        chunk = f.read(chunk_size)
+
+def _read_lrc_stream(f, head, encoding, chunk_size):
+    lines = []
+    has_japanese = False
+    has_russian = False
+    has_text = False
+    all_caps = True
+    
+    for line in _decode_lines(f, head, encoding, chunk_size):
+        if not has_japanese and JAPANESE_RE.search(line):
+            has_japanese = True
+        if not has_russian and RUSSIAN_RE.search(line):
+            has_russian = True
+        if all_caps:
+            match = LRC_LINE_RE.match(line)
+            if match:
+                lyric = match.group(2).strip()
+                if lyric:
+                    has_text = True
+                    if not lyric[0].isupper():
+                        all_caps = False
+        lines.append(line)
+    
+    info = {
+        'encoding': encoding,
+        'capitalized': has_text and all_caps,
+        'language': language_from_flags(has_japanese, has_russian)
+    }
+    return lines, info
+
+def detect_file_encoding(file_path, chunk_size=65536):
+    """
+    Sniffs a file's encoding from its first chunk and checks that the rest of the file
+    decodes with it, guessing again if it does not. Reads the file in constant memory.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(chunk_size)
+        failed = set()
+        while True:
+            encoding = detect_encoding(head, exclude=failed)
+            decoder = codecs.getincrementaldecoder(encoding)()
+            chunk = head
+            try:
+                while chunk:
+                    decoder.decode(chunk)
+                    chunk = f.read(chunk_size)
+                decoder.decode(b'', final=True)
+                return encoding
+            except UnicodeDecodeError:
+                failed.add(encoding)
+            f.seek(len(head))
+
+def iter_lrc_lines(file_path, encoding=None, chunk_size=65536):
+    """
+    Yields the lines of an .lrc file one at a time, for files too large for read_lrc_file.
+    Unless given, the encoding is found first with detect_file_encoding.
+    """
+    if encoding is None:
+        encoding = detect_file_encoding(file_path, chunk_size)
+    with open(file_path, 'rb') as f:
+        yield from _decode_lines(f, f.read(chunk_size), encoding, chunk_size)
+
+class TTMLTimeError(ValueError):
+    """A begin/end value that is not a valid TTML time expression"""
+    pass
+
+TTML_PARAMETER_NS = 'http://www.w3.org/ns/ttml#parameter'
+
+# TTML time expressions: offset-time ("12.5s", "500ms", "3f", "1.2h", "40t") or clock-time
+# ("hh:mm:ss.fff", "hh:mm:ss:ff.sub"). Apple Music also writes "mm:ss.fff" and plain "ss.fff".
+TTML_TIME_RE = re.compile(
+    r'^\s*(?:(?P<count>\d+(?:\.\d+)?)(?P<metric>h|ms|m|s|f|t)'
+    r'|(?:(?:(?P<hours>\d+):)?(?P<minutes>\d+):)?(?P<seconds>\d+(?:\.\d+)?)'
+    r'(?::(?P<frames>\d+)(?:\.(?P<subframes>\d+))?)?)\s*$'
+)
+
+class TTMLTiming:
+    """
+    Frame and tick rates a document's times are expressed in, from its ttp: attributes.
+    Defaults follow the TTML spec: 30 fps, one sub-frame per frame, and a tick rate of
+    frameRate * subFrameRate if only a frame rate is given (1 otherwise).
+    """
+    def __init__(self, frame_rate=30.0, sub_frame_rate=1, tick_rate=1.0):
+        self.frame_rate = frame_rate
+        self.sub_frame_rate = sub_frame_rate
+        self.tick_rate = tick_rate
+
+    @classmethod
+    def from_root(cls, root):
+        attrib = root.attrib
+        try:
+            frame_rate = attrib.get(f'{{{TTML_PARAMETER_NS}}}frameRate')
+            sub_frame_rate = int(attrib.get(f'{{{TTML_PARAMETER_NS}}}subFrameRate', 1))
+            numerator, denominator = attrib.get(f'{{{TTML_PARAMETER_NS}}}frameRateMultiplier', '1 1').split()
+            effective_rate = int(frame_rate or 30) * int(numerator) / int(denominator)
+            tick_rate = attrib.get(f'{{{TTML_PARAMETER_NS}}}tickRate')
+            if tick_rate is not None:
+                tick_rate = int(tick_rate)
+            else:
+                tick_rate = effective_rate * sub_frame_rate if frame_rate else 1
+        except (ValueError, ZeroDivisionError) as e:
+            raise TTMLTimeError(f"Invalid TTML timing parameters: {e}")
+        if effective_rate <= 0 or sub_frame_rate <= 0 or tick_rate <= 0:
+            raise TTMLTimeError("TTML frame, sub-frame and tick rates must be positive")
+        return cls(effective_rate, sub_frame_rate, tick_rate)
+
+DEFAULT_TTML_TIMING = TTMLTiming()
+
+def ttml_time_to_seconds(ttml_time, timing=DEFAULT_TTML_TIMING):
+    """
+    Converts a TTML time expression to seconds (float).
+    Raises TTMLTimeError for values that are not valid TTML times.
+    """
+    match = TTML_TIME_RE.match(ttml_time)
+    if not match:
+        raise TTMLTimeError(f"Invalid TTML time: {ttml_time!r}")
+
+    metric = match.group('metric')
+    if metric:
+        count = float(match.group('count'))
+        if metric == 'h':
+            return count * 3600
+        if metric == 'm':
+            return count * 60
+        if metric == 's':
+            return count
+        if metric == 'ms':
+            return count / 1000
+        if metric == 'f':
+            return count / timing.frame_rate
+        return count / timing.tick_rate
+
+    hours, minutes, frames = match.group('hours', 'minutes', 'frames')
+    seconds = float(match.group('seconds'))
+    if frames is not None:
+        # Frames only appear in the full hh:mm:ss:ff form, with whole seconds
+        if hours is None or '.' in match.group('seconds'):
+            raise TTMLTimeError(f"Invalid TTML time: {ttml_time!r}")
+        seconds += int(frames) / timing.frame_rate
+        subframes = match.group('subframes')
+        if subframes is not None:
+            seconds += int(subframes) / (timing.frame_rate * timing.sub_frame_rate)
+    if minutes is not None:
+        seconds += int(minutes) * 60
+    if hours is not None:
+        seconds += int(hours) * 3600
+    return seconds
+
+def parse_document_times(root):
+    """
+    Parses every begin/end pair in a TTML document at once.
+    Returns {element: (begin_seconds, end_seconds)} for elements with both attributes;
+    elements with invalid times are reported with a warning and left out.
+    """
+    timing = TTMLTiming.from_root(root)
+    # Consecutive spans share boundaries, so most values are parsed only once
+    parsed = {}
+    def seconds(value):
+        if value not in parsed:
+            parsed[value] = ttml_time_to_seconds(value, timing)
+        return parsed[value]
+
+    times = {}
+    for element in root.iter():
+        begin = element.attrib.get('begin')
+        end = element.attrib.get('end')
+        if begin and end:
+            try:
+                times[element] = (seconds(begin), seconds(end))
+            except TTMLTimeError as e:
+                text = (element.text or '').strip()
+                print(f"Warning: skipping TTML element {text!r}: {e}")
+    return times
 
 def convert_ttml_time(ttml_time):
     """
     Converts TTML time string to LRC timestamp format.
+    Raises TTMLTimeError for invalid times.
     """
-    total_seconds = ttml_time_to_seconds(ttml_time)
-    m_int = int(total_seconds // 60)
-    s_float = total_seconds % 60
-    s_int = int(s_float)
-    cs = int((s_float - s_int) * 100)
+    return format_lrc_time(ttml_time_to_seconds(ttml_time))
+
+def format_lrc_time(total_seconds):
+    """
+    Formats seconds (float) as an LRC mm:ss.xx timestamp, rounded to the nearest
+    centisecond (11.2 is 00:11.20, not 00:11.19 as the float 11.1999... would truncate to).
+    """
+    cs_total = int(round(total_seconds * 100))
+    m_int, cs = divmod(cs_total, 6000)
+    s_int, cs = divmod(cs, 100)
     return f"{m_int:02d}:{s_int:02d}.{cs:02d}"
 
-def extract_ttml_data(file_path):
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+ITUNES_NS = 'http://music.apple.com/lyric-ttml-internal'
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+class TTMLIndex:
+    """
+    Every lyric track of a TTML document, indexed in one parse.
+    Tracks are named 'body', 'transliteration:<lang>' and 'translation:<lang>', each a list
+    of (line_id, spans) in document order with spans in extract_ttml_data format.
+    Lines without timed spans (e.g. translations) take the timing of the body line with the same key.
+    """
+    def __init__(self, root):
+        self.lang = root.attrib.get(XML_LANG, '')
+        self.tracks = {}
+        self.line_times = {}
+        times = parse_document_times(root)
+
+        body = []
+        for p in root.iter():
+            if local_name(p.tag) == 'p':
+                line_id = p.attrib.get(f'{{{ITUNES_NS}}}key')
+                spans = self._timed_spans(p, line_id, times)
+                if p in times:
+                    self.line_times[line_id] = times[p]
+                elif spans:
+                    self.line_times[line_id] = (spans[0]['start'], max(span['end'] for span in spans))
+                body.append((line_id, spans or self._untimed_line(p, line_id)))
+        self.tracks['body'] = body
+
+        for element in root.iter():
+            kind = local_name(element.tag)
+            if kind not in ('transliteration', 'translation'):
+                continue
+            lines = []
+            for text_node in element.iter():
+                if local_name(text_node.tag) == 'text':
+                    line_id = text_node.attrib.get('for')
+                    lines.append((line_id, self._timed_spans(text_node, line_id, times) or self._untimed_line(text_node, line_id)))
+            name = f"{kind}:{element.attrib.get(XML_LANG, '')}"
+            count = 1
+            while name in self.tracks:
+                count += 1
+                name = f"{kind}:{element.attrib.get(XML_LANG, '')}#{count}"
+            self.tracks[name] = lines
+
+    def _timed_spans(self, node, line_id, times):
+        spans = []
+        for span in node.iter():
+            if local_name(span.tag) == 'span' and span.text and span in times:
+                begin, end = times[span]
+                spans.append({'start': begin, 'end': end, 'text': span_text(span), 'line_id': line_id})
+        return spans
+
+    def _untimed_line(self, node, line_id):
+        text = ''.join(node.itertext()).strip()
+        if not text or line_id not in self.line_times:
+            return []
+        begin, end = self.line_times[line_id]
+        return [{'start': begin, 'end': end, 'text': text, 'line_id': line_id}]
+
+    def track_names(self):
+        return list(self.tracks)
+
+    def default_track(self):
+        """The first transliteration if there is one, otherwise the body"""
+        for name in self.tracks:
+            if name.startswith('transliteration:'):
+                return name
+        return 'body'
+
+    def spans(self, track=None):
+        """Returns the spans of one track (default_track() if None) as extract_ttml_data does"""
+        track = track or self.default_track()
+        if track not in self.tracks:
+            raise ValueError(f"Unknown TTML track: {track}")
+        return [span for line_id, spans in self.tracks[track] for span in spans]
+
+    def aligned(self, tracks=None):
+        """
+        Lines of several tracks side by side, in body order:
+        [{'line_id', 'start', 'end', <track>: text, ...}, ...]. Tracks missing a line get ''.
+        """
+        tracks = tracks or self.track_names()
+        texts = {}
+        for track in tracks:
+            if track not in self.tracks:
+                raise ValueError(f"Unknown TTML track: {track}")
+            texts[track] = {line_id: "".join(span['text'] for span in spans).strip()
+                            for line_id, spans in self.tracks[track]}
+        lines = []
+        for line_id, spans in self.tracks['body']:
+            start, end = self.line_times.get(line_id, (0.0, 0.0))
+            line = {'line_id': line_id, 'start': start, 'end': end}
+            for track in tracks:
+                line[track] = texts[track].get(line_id, '')
+            lines.append(line)
+        return lines
+
+def ttml_root(content):
+    """Parses TTML (or the TTML inside Apple Music JSON) into its root element"""
+    # Check for JSON wrapper
+    if content.strip().startswith('{'):
+        data = json.loads(content)
+        try:
+            ttml_content = data['data'][0]['attributes']['ttmlLocalizations']
+        except (KeyError, IndexError, TypeError):
+            match = re.search(r'<tt.*?</tt>', content, re.DOTALL)
+            if match:
+                ttml_content = match.group(0)
+            else:
+                raise ValueError("Could not find TTML content in JSON")
+    else:
+        ttml_content = content
+
+    # Parse XML
+    ttml_content = re.sub(r'^<\?xml.*?\?>', '', ttml_content).strip()
+    return ET.fromstring(ttml_content)
+
+def index_ttml_text(content):
+    """Builds a TTMLIndex from TTML text, raising on malformed input"""
+    return TTMLIndex(ttml_root(content))
+
+def index_ttml(file_path):
+    """Builds a TTMLIndex of a .ttml file, or returns None if it can't be read"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return index_ttml_text(f.read())
+    except Exception as e:
+        print(f"Error indexing TTML data: {e}")
+        return None
+
+def extract_ttml_data(file_path, track=None):
     """
     Parses TTML and returns a list of data dictionaries:
     [{'start': float, 'end': float, 'text': str, 'line_id': str}, ...]
+    track selects a TTMLIndex track; by default the first transliteration, else the body.
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
-            
-        # Check for JSON wrapper
-        if content.strip().startswith('{'):
-            data = json.loads(content)
-            try:
-                ttml_content = data['data'][0]['attributes']['ttmlLocalizations']
-            except (KeyError, IndexError, TypeError):
-                match = re.search(r'<tt.*?</tt>', content, re.DOTALL)
-                if match:
-                    ttml_content = match.group(0)
-                else:
-                    raise ValueError("Could not find TTML content in JSON")
-        else:
-            ttml_content = content
-
-        # Parse XML
-        ttml_content = re.sub(r'^<\?xml.*?\?>', '', ttml_content).strip()
-        root = ET.fromstring(ttml_content)
-        
-        ns = {
-            'tt': 'http://www.w3.org/ns/ttml',
-            'itunes': 'http://music.apple.com/lyric-ttml-internal'
-        }
-        
-        # Find transliterations
-        trans_root = None
-        for trans in root.iter():
-            if trans.tag.endswith('transliteration'):
-                # Prefer ja-Latn or just take the first one
-                trans_root = trans
-                break
-        
-        source_root = trans_root if trans_root is not None else None
-        
-        extracted_spans = []
-        
-        if source_root is not None:
-            # Extract from transliteration
-            for text_node in source_root.iter():
-                if text_node.tag.endswith('text'):
-                    line_id = text_node.attrib.get('for')
-                    for span in text_node.iter():
-                        if span.tag.endswith('span') and span.text:
-                            begin = span.attrib.get('begin')
-                            end = span.attrib.get('end')
-                            if begin and end:
-                                extracted_spans.append({
-                                    'start': ttml_time_to_seconds(begin),
-                                    'end': ttml_time_to_seconds(end),
-                                    'text': span.text,
-                                    'line_id': line_id
-                                })
-        else:
-            # Extract from body
-            for p in root.iter():
-                if p.tag.endswith('p'):
-                    line_id = p.attrib.get(f'{{{ns["itunes"]}}}key')
-                    for span in p.iter():
-                        if span.tag.endswith('span') and span.text:
-                            begin = span.attrib.get('begin')
-                            end = span.attrib.get('end')
-                            if begin and end:
-                                extracted_spans.append({
-                                    'start': ttml_time_to_seconds(begin),
-                                    'end': ttml_time_to_seconds(end),
-                                    'text': span.text,
-                                    'line_id': line_id
-                                })
-                                
-        return extracted_spans
+    except Exception as e:
+        print(f"Error extracting TTML data: {e}")
+        return []
+    return extract_ttml_data_from_text(content, track)
 
+def extract_ttml_data_from_text(content, track=None):
+    """
+    Same as extract_ttml_data, for TTML (or Apple Music JSON) that is already in memory.
+    """
+    try:
+        return index_ttml_text(content).spans(track)
     except Exception as e:
         print(f"Error extracting TTML data: {e}")
         return []
 
+def span_text(span):
+    """
+    Returns the text of a TTML span, keeping a single trailing space when the span is
+    followed by whitespace (word-timed bodies put the space between words outside the spans).
+    """
+    text = span.text
+    if span.tail and span.tail.isspace() and not text[-1:].isspace():
+        text += ' '
+    return text
+
+def iter_ttml_lines(data):
+    """
+    Groups extract_ttml_data spans by line_id.
+    Yields (line_id, spans) for each run of consecutive spans of the same line.
+    """
+    current_line_id = None
+    current_spans = []
+    for item in data:
+        if item['line_id'] != current_line_id or not current_spans:
+            if current_spans:
+                yield current_line_id, current_spans
+            current_line_id = item['line_id']
+            current_spans = []
+        current_spans.append(item)
+    if current_spans:
+        yield current_line_id, current_spans
+
 def parse_ttml(file_path):
     """
     Parses a TTML file and returns a list of strings in LRC format.
     Uses extract_ttml_data to get the raw data first.
     """
-    data = extract_ttml_data(file_path)
     lrc_lines = []
-    
-    # Group by line_id to reconstruct lines for LRC
-    current_line_id = None
-    current_line_parts = []
-    current_start_time = 0.0
-    
-    for item in data:
-        if item['line_id'] != current_line_id:
-            if current_line_id is not None:
-                # Flush previous line
-                # Use the start time of the first span
-                lrc_timestamp = convert_ttml_time(str(current_start_time))
-                full_text = "".join(current_line_parts).strip()
-                lrc_lines.append(f"[{lrc_timestamp}] {full_text}")
-            
-            current_line_id = item['line_id']
-            current_line_parts = []
-            current_start_time = item['start']
-            
-        current_line_parts.append(item['text'])
-        
-    # Flush last line
-    if current_line_id is not None:
-        lrc_timestamp = convert_ttml_time(str(current_start_time))
-        full_text = "".join(current_line_parts).strip()
-        lrc_lines.append(f"[{lrc_timestamp}] {full_text}")
-        
+    for line_id, spans in iter_ttml_lines(extract_ttml_data(file_path)):
+        # Use the start time of the first span
+        full_text = "".join(item['text'] for item in spans).strip()
+        lrc_lines.append(f"[{format_lrc_time(spans[0]['start'])}] {full_text}")
     return lrc_lines
 
 def parse_rocksmith_beatmap(xml_path):
     """Parses a Rocksmith XML file to extract beat times."""
     try:
         tree = ET.parse(xml_path)
-        root = tree.getroot()
-        ebeats = root.find('ebeats')
-        if ebeats is None:
-            return []
-        
-        beats = []
-        for ebeat in ebeats.findall('ebeat'):
-            time_val = float(ebeat.get('time'))
-            beats.append(time_val)
-        return sorted(beats)
+        return beats_from_beatmap(tree.getroot())
     except Exception as e:
         print(f"Error parsing beatmap: {e}")
         return []
 
+def beats_from_beatmap(root):
+    """Returns the sorted beat times from a parsed Rocksmith arrangement root element."""
+    ebeats = root.find('ebeats')
+    if ebeats is None:
+        return []
+    
+    beats = []
+    for ebeat in ebeats.findall('ebeat'):
+        time_val = float(ebeat.get('time'))
+        beats.append(time_val)
+    return sorted(beats)
+
 def snap_to_grid(time_val, beats, resolution=16):
     """
     Snaps a time value to the nearest grid point based on beats.
@@ -253,107 +834,426 @@ def snap_to_grid(time_val, beats, resolution=16):
     closest_time = min(grid_points, key=lambda x: abs(x - time_val))
     return closest_time
 
-def export_rocksmith_xml(data, output_path, offset=10.0, beatmap_path=None, empty_measure=False):
+# Rocksmith export pipeline
+#
+# The export runs as a chain of generator stages, each taking and yielding one record
+# (a dict) per TTML span, so any number of spans passes through in constant memory:
+#
+#   extract    {'start', 'end', 'text', 'line_id'}      seconds, span text, line key
+#   normalize  + 'index', 'end_of_phrase'               position in the input, last span of its line
+#   romanize   + 'romanized'                            text with Japanese converted to romaji
+#   syllabize  + 'words'                                [[syllable, ...], ...] per word
+#   time       + 'time'                                 start + offset, in seconds
+#   snap       'time' moved to the beat grid
+#   serialize  one <vocal> per syllable, 0.25s apart from the record's time
+#
+# Custom stages take an iterable of records and yield records, adding keys as needed.
+
+def extract_stage(file_path, track=None):
+    """Source stage: the spans of one TTML track, see extract_ttml_data"""
+    yield from extract_ttml_data(file_path, track)
+
+def normalize_stage(records):
+    """Numbers the records and marks the last span of each line, looking one record ahead"""
+    previous = None
+    for index, record in enumerate(records):
+        record = dict(record, index=index)
+        if previous is not None:
+            previous['end_of_phrase'] = record['line_id'] != previous['line_id']
+            yield previous
+        previous = record
+    if previous is not None:
+        previous['end_of_phrase'] = True
+        yield previous
+
+def _romanize_line_records(records):
+    return [dict(record, romanized=text) for record, text in zip(records, romanize_line_spans(records))]
+
+def romanize_stage(records, executor=None, window=None):
     """
-    Exports syllabized lyrics to Rocksmith XML format.
-    
-    Args:
-        data: List of (timestamp, text) tuples.
-        output_path: Path to save the XML file.
-        offset: Time offset in seconds to add to all timestamps.
-        beatmap_path: Path to Rocksmith XML beatmap for snapping.
-        empty_measure: If True, adds the duration of the first measure to the offset.
+    Romanizes a line at a time so split kanji keep their reading (see romanize_line_spans).
+    With an executor, lines are romanized concurrently and still come out in order.
     """
-    import xml.etree.ElementTree as ET
-    
-    root = ET.Element("vocals", count=str(len(data)))
-    
-    beats = []
-    measure_duration = 0.0
-    
-    if beatmap_path:
-        beats = parse_rocksmith_beatmap(beatmap_path)
-        if empty_measure and len(beats) >= 2:
-            # Estimate measure duration from first beat interval * 4 (assuming 4/4)
-            beat_interval = beats[1] - beats[0]
-            measure_duration = beat_interval * 4.0
-    
-    final_offset = offset + measure_duration
+    lines = (spans for line_id, spans in iter_ttml_lines(records))
+    for line in ordered_map(_romanize_line_records, lines, executor, window):
+        yield from line
 
-    for i, item in enumerate(data):
-        text = item['text']
-        time_val = item['start']
-        
-        # Romanize if Japanese
-        lang = detect_language(text)
-        if lang == 'japanese' and kks:
-            result = kks.convert(text)
-            romanized_text = ""
-            for item_res in result:
-                romanized_text += item_res['hepburn'] + " "
-            text = romanized_text.strip()
-            # Clean up extra spaces
-            text = re.sub(r'\s+', ' ', text)
-        
-        # Apply Offset
-        time_val += final_offset
-        
-        # Snap to grid if beatmap is provided
+def syllabize_stage(records):
+    english_dict = None
+    for record in records:
+        if english_dict is None:
+            english_dict = get_english_dict()
+        yield dict(record, words=[word_syllables(word, english_dict) for word in record['romanized'].split()])
+
+def time_stage(records, offset=0.0):
+    for record in records:
+        yield dict(record, time=record['start'] + offset)
+
+def snap_stage(records, beats=None):
+    for record in records:
         if beats:
-            time_val = snap_to_grid(time_val, beats)
-        
-        words = text.split()
-        current_time = time_val
-        
-        for w_idx, word in enumerate(words):
-            lang = detect_language(word)
-            syllables = []
-            if lang == 'japanese':
-                syl_str = syllabize_word(word, separator='-')
-                syllables = syl_str.split('-')
-            elif lang == 'russian':
-                syl_str = syllabize_russian_word(word, separator='-')
-                syllables = syl_str.split('-')
-            else:
-                syl_str = syllabize_english_word(word, separator='-')
-                syllables = syl_str.split('-')
-            
+            record = dict(record, time=snap_to_grid(record['time'], beats))
+        yield record
+
+def ordered_map(func, items, executor=None, window=None):
+    """
+    Yields func(item) for every item in input order. With an executor (thread or process
+    pool), at most window calls are in flight at once, so long inputs stay in constant memory.
+    """
+    if executor is None:
+        for item in items:
+            yield func(item)
+        return
+
+    import collections
+    import concurrent.futures
+    engine = _active_engine.get()
+    if engine is not None and not isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        # Pool threads don't see the caller's engine; worker processes use their default one
+        func = functools.partial(engine.call, func)
+    window = window or 2 * (getattr(executor, '_max_workers', None) or os.cpu_count() or 1)
+    pending = collections.deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def rocksmith_offset(offset=10.0, beats=None, empty_measure=False):
+    """The time offset of the vocals, including the first measure if empty_measure"""
+    measure_duration = 0.0
+    if beats and empty_measure and len(beats) >= 2:
+        # Estimate measure duration from first beat interval * 4 (assuming 4/4)
+        measure_duration = (beats[1] - beats[0]) * 4.0
+    return offset + measure_duration
+
+def rocksmith_stages(offset=10.0, beats=None, empty_measure=False, executor=None):
+    """
+    The default stages after extract, in order. Callers can insert their own stages into
+    the returned list before passing it to export_rocksmith_xml.
+    """
+    return [
+        normalize_stage,
+        lambda records: romanize_stage(records, executor),
+        syllabize_stage,
+        lambda records: time_stage(records, rocksmith_offset(offset, beats, empty_measure)),
+        lambda records: snap_stage(records, beats),
+    ]
+
+def run_stages(records, stages):
+    for stage in stages:
+        records = stage(records)
+    return records
+
+def vocal_elements(records):
+    """Serialize stage: yields one <vocal> element per syllable of the timed records"""
+    for record in records:
+        words = record['words']
+        current_time = record['time']
+        for w_idx, syllables in enumerate(words):
             for s_idx, syl in enumerate(syllables):
-                vocal = ET.SubElement(root, "vocal")
+                vocal = ET.Element("vocal")
                 vocal.set("time", f"{current_time:.3f}")
                 vocal.set("note", "0")
                 vocal.set("length", "0.200")
                 
-                is_last_syllable = (s_idx == len(syllables) - 1)
-                is_last_word = (w_idx == len(words) - 1)
-                
                 lyric_text = syl
-                if not is_last_syllable:
+                if s_idx < len(syllables) - 1:
                     lyric_text += "-"
-                elif not is_last_word:
+                elif w_idx < len(words) - 1 or record['end_of_phrase']:
+                    # End of a word, or last syllable of the line (phrase)
                     lyric_text += "+"
-                else:
-                    # Last syllable of last word
-                    # Check if this is the end of the line (phrase)
-                    is_end_of_phrase = False
-                    if i == len(data) - 1:
-                        is_end_of_phrase = True
-                    elif data[i+1]['line_id'] != item['line_id']:
-                        is_end_of_phrase = True
-                    
-                    if is_end_of_phrase:
-                        lyric_text += "+"
-                
                 vocal.set("lyric", lyric_text)
-                current_time += 0.25 
+                yield vocal
+                current_time += 0.25
 
-    tree = ET.ElementTree(root)
-    try:
-        tree.write(output_path, encoding="utf-8", xml_declaration=True)
-        return True
-    except Exception as e:
-        print(f"Error writing XML: {e}")
-        return False
+def serialize_vocals(record):
+    """The <vocal> elements of one timed record as ElementTree writes them ('' if it has none)"""
+    # Serialized in one call under a throwaway parent, whose tags are cut off again
+    parent = ET.Element("v")
+    parent.extend(vocal_elements([record]))
+    if not len(parent):
+        return ''
+    return ET.tostring(parent, encoding='unicode')[len("<v>"):-len("</v>")]
+
+def write_rocksmith_vocals(records, output_path, count=None):
+    """
+    Streams the vocals of timed records to output_path, byte for byte as ElementTree writes them.
+    count is the number of spans; if it isn't known up front the vocals go to a temporary
+    file first, since the count comes before them.
+    """
+    import shutil
+    import tempfile
+
+    with open(output_path, 'wb') as out:
+        out.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+        if count is not None:
+            empty = True
+            for record in records:
+                vocals = serialize_vocals(record)
+                if vocals and empty:
+                    out.write(f'<vocals count="{count}">'.encode('utf-8'))
+                    empty = False
+                out.write(vocals.encode('utf-8'))
+        else:
+            count = 0
+            empty = True
+            with tempfile.TemporaryFile() as body:
+                for record in records:
+                    count += 1
+                    vocals = serialize_vocals(record)
+                    if vocals:
+                        body.write(vocals.encode('utf-8'))
+                        empty = False
+                if not empty:
+                    out.write(f'<vocals count="{count}">'.encode('utf-8'))
+                    body.seek(0)
+                    shutil.copyfileobj(body, out)
+        # ElementTree closes an element without children as <vocals ... />
+        out.write(f'<vocals count="{count}" />'.encode('utf-8') if empty else b'</vocals>')
+
+def export_rocksmith_xml(data, output_path, offset=10.0, beatmap_path=None, empty_measure=False, stages=None):
+    """
+    Exports syllabized lyrics to Rocksmith XML format.
+    
+    Args:
+        data: extract_ttml_data spans (any iterable of them, see the pipeline above).
+        output_path: Path to save the XML file.
+        offset: Time offset in seconds to add to all timestamps.
+        beatmap_path: Path to Rocksmith XML beatmap for snapping.
+        empty_measure: If True, adds the duration of the first measure to the offset.
+        stages: Stages to run instead of rocksmith_stages(offset, beats, empty_measure).
+    """
+    return current_engine().export_rocksmith(data, output_path, beatmap_path, stages,
+                                             offset=offset, empty_measure=empty_measure)
+
+def build_rocksmith_tree(data, offset=10.0, beats=None, empty_measure=False):
+    """
+    Builds the Rocksmith vocals ElementTree for export_rocksmith_xml without writing it.
+    beats are the beat times of the arrangement to snap to (see parse_rocksmith_beatmap).
+    """
+    root = ET.Element("vocals", count=str(len(data)))
+    root.extend(vocal_elements(run_stages(data, rocksmith_stages(offset, beats, empty_measure))))
+    return ET.ElementTree(root)
+
+def romanize_japanese(text):
+    """Romanizes Japanese text with kakasi, one space between the converted tokens."""
+    hepburn = ' '.join(item['hepburn'] for item in get_kakasi().convert(text))
+    return WHITESPACE_RE.sub(' ', hepburn.strip())
+
+def romanize_japanese_words(text, kks=None):
+    """
+    Romanizes Japanese text into words of romaji syllables, one word per kakasi token.
+    Syllables come from the mora boundaries of each token's kana reading (see kana.py);
+    tokens without a kana reading (Latin text, punctuation) are split from their romaji.
+    A token that continues the one before it (kakasi splits 笑って into 笑っ and て) is
+    read together with it, so the sokuon still doubles the next consonant: wa+rat+te.
+    kks is the kakasi converter to use (default: get_kakasi()).
+    """
+    if kks is None:
+        kks = get_kakasi()
+    words = []
+    # Kana reading and romaji of the word being read, which may span several tokens
+    reading = hepburn = ''
+    for token in kks.convert(text):
+        hira = token['hira']
+        if hira and kana.KANA.issuperset(hira):
+            if reading and kana.continues_word(reading, hira):
+                reading += hira
+                hepburn += token['hepburn']
+                continue
+            _add_reading_words(words, reading, hepburn)
+            reading, hepburn = hira, token['hepburn']
+            continue
+        _add_reading_words(words, reading, hepburn)
+        reading = hepburn = ''
+        for word in token['hepburn'].split():
+            words.append(split_romaji(word))
+    _add_reading_words(words, reading, hepburn)
+    return words
+
+def _add_reading_words(words, reading, hepburn):
+    """Appends the romaji syllables of a kana reading, or of its romaji if they can't be read from the kana"""
+    if not reading:
+        return
+    syllables = kana.romaji_syllables(reading)
+    if syllables:
+        words.append(syllables)
+        return
+    for word in hepburn.split():
+        words.append(split_romaji(word))
+
+def romanize_segment(text):
+    """Romanizes a TTML span if it is Japanese, the way the Rocksmith export does."""
+    if get_kakasi() and detect_language(text) == 'japanese':
+        return romanize_japanese(text)
+    return text
+
+# Kana that extend the previous mora into one reading unit (じょう, かい, かん)
+KANA_EXTENDERS = 'ゃゅょぁぃぅぇぉゎーん'
+
+to_hiragana = kana.to_hiragana
+is_kana = kana.is_kana
+
+def reading_units(hira):
+    """
+    Splits a hiragana reading into syllable-like units: morae joined with long vowels and
+    diphthongs, with a small っ starting the unit of the consonant it doubles (が|っこう).
+    """
+    units = []
+    for char in hira:
+        if units and (units[-1] == 'っ' or char in KANA_EXTENDERS
+                      or (char in 'いう' and units[-1][-1] not in 'いうん')):
+            units[-1] += char
+        else:
+            units.append(char)
+    return units
+
+def share_reading(reading, count):
+    """Divides a kanji run's reading over its count characters by reading unit"""
+    units = reading_units(reading)
+    shares = []
+    pos = 0
+    for k in range(count):
+        end = len(units) if k == count - 1 else min(max(len(units) * (k + 1) // count, pos + 1), len(units))
+        shares.append(''.join(units[pos:end]))
+        pos = end
+    return shares
+
+def split_token_reading(token, lengths):
+    """
+    Divides a kakasi token's hiragana reading over consecutive pieces of its original text
+    (lengths in characters). Kana keep their own reading and anchor the kanji around them;
+    each run of kanji shares the reading between its anchors in proportion to its length.
+    """
+    orig = token['orig']
+    hira = token['hira']
+
+    runs = []
+    for char in orig:
+        kana = is_kana(char)
+        if runs and runs[-1][0] == kana:
+            runs[-1][1] += char
+        else:
+            runs.append([kana, char])
+
+    char_readings = []
+    pos = 0
+    for r_idx, (kana, text) in enumerate(runs):
+        if kana and hira.startswith(to_hiragana(text), pos):
+            char_readings.extend(to_hiragana(text))
+            pos += len(text)
+            continue
+        # Kanji (or unmatched kana): read up to where the next kana run appears
+        end = -1
+        if r_idx + 1 < len(runs):
+            end = hira.find(to_hiragana(runs[r_idx + 1][1]), pos + 1)
+        if end == -1 or r_idx + 1 == len(runs):
+            end = len(hira)
+        char_readings.extend(share_reading(hira[pos:end], len(text)))
+        pos = end
+
+    readings = []
+    pos = 0
+    for length in lengths:
+        readings.append(''.join(char_readings[pos:pos + length]))
+        pos += length
+    return readings
+
+def romanize_line_spans(spans):
+    """
+    Romanizes the spans of one lyric line, returning one text per span.
+    Japanese lines are converted with a single kakasi call, so kanji split over several
+    spans keep their reading in context. Each token's romaji goes back to the span its
+    characters came from; a token crossing span boundaries is divided with split_token_reading.
+    Spans that aren't Japanese are returned unchanged.
+    """
+    kks = get_kakasi()
+    texts = [item['text'] for item in spans]
+    is_japanese = [bool(kks) and detect_language(text) == 'japanese' for text in texts]
+    if not any(is_japanese):
+        return texts
+
+    # Character offset where each span ends within the line
+    bounds = []
+    total = 0
+    for text in texts:
+        total += len(text)
+        bounds.append(total)
+
+    tokens = kks.convert(''.join(texts))
+    if ''.join(token['orig'] for token in tokens) != ''.join(texts):
+        # kakasi changed the text (shouldn't happen); fall back to one call per span
+        return [romanize_segment(text) for text in texts]
+
+    pieces = [[] for _ in texts]
+    readings = []
+    pos = 0
+    span_idx = 0
+    for token in tokens:
+        token_start, token_end = pos, pos + len(token['orig'])
+        pos = token_end
+        if not token['orig']:
+            continue
+        while bounds[span_idx] <= token_start:
+            span_idx += 1
+        if token_end <= bounds[span_idx]:
+            pieces[span_idx].append(token['hepburn'])
+            continue
+
+        # Token crosses span boundaries: give each span the reading of its characters
+        lengths = []
+        char_pos = token_start
+        idx = span_idx
+        while char_pos < token_end:
+            piece_end = min(bounds[idx], token_end)
+            lengths.append(piece_end - char_pos)
+            char_pos = piece_end
+            idx += 1
+        for offset, reading in enumerate(split_token_reading(token, lengths)):
+            if reading:
+                # Placeholder for the romaji of this reading, converted below
+                pieces[span_idx + offset].append(len(readings))
+                readings.append(reading)
+
+    if readings:
+        # Readings are plain hiragana, so a single call with '|' between them splits back cleanly
+        romaji = ''.join(item['hepburn'] for item in kks.convert('|'.join(readings))).split('|')
+        if len(romaji) != len(readings):
+            romaji = [''.join(item['hepburn'] for item in kks.convert(reading)) for reading in readings]
+
+    results = []
+    for piece, text, japanese in zip(pieces, texts, is_japanese):
+        if not japanese:
+            results.append(text)
+            continue
+        words = []
+        for p_idx, part in enumerate(piece):
+            if isinstance(part, int):
+                # Fragments of two split tokens next to each other form one word
+                if p_idx and isinstance(piece[p_idx - 1], int):
+                    words[-1] += romaji[part]
+                    continue
+                part = romaji[part]
+            words.append(part)
+        results.append(WHITESPACE_RE.sub(' ', ' '.join(words).strip()))
+    return results
+
+def romanize_spans(data):
+    """romanize_line_spans over every line of extract_ttml_data spans, one text per span"""
+    return current_engine().romanize_spans(data)
+
+def word_syllables(word, english_dict=None):
+    """Splits one word into syllables, detecting the language of the word on its own."""
+    lang = detect_language(word)
+    if lang == 'japanese':
+        syl_str = syllabize_word(word, separator='-')
+    elif lang == 'russian':
+        syl_str = syllabize_russian_word(word, separator='-')
+    else:
+        syl_str = syllabize_english_word(word, '-', english_dict)
+    return syl_str.split('-')
 
 def syllabize_russian_word(word, separator="+"):
     vowels = "аеёиоуыэюяАЕЁИОУЫЭЮЯ"
@@ -390,9 +1290,17 @@ def syllabize_russian_word(word, separator="+"):
         
     return separator.join(syllables)
 
-def syllabize_english_word(word, separator="+"):
+def strip_punctuation(word):
+    """Splits a word into (leading punctuation, core, trailing punctuation)"""
+    match = WORD_PUNCTUATION_RE.match(word)
+    if not match:
+        return '', word, ''
+    return match.groups()
+
+def syllabize_english_word(word, separator="+", english_dict=None):
+    """english_dict is the dictionary to look the word up in (default: get_english_dict())"""
     # Strip punctuation
-    match = re.match(r'^([^\w]*)(.*?)([^\w]*)$', word)
+    match = WORD_PUNCTUATION_RE.match(word)
     if not match:
         return word
         
@@ -404,8 +1312,10 @@ def syllabize_english_word(word, separator="+"):
     lower_core = core.lower()
     
     # Look up in English.txt dictionary
-    if lower_core in english_dict:
-        syllabified = english_dict[lower_core]
+    if english_dict is None:
+        english_dict = get_english_dict()
+    syllabified = english_dict.get(lower_core)
+    if syllabified is not None:
         # Replace • with the desired separator
         syllabified = syllabified.replace('•', separator)
         
@@ -422,12 +1332,14 @@ def syllabize_english_word(word, separator="+"):
     # If not found in dictionary, return as-is
     return word
 
-def syllabize_word(word, separator="+", language="japanese"):
-    if language == 'russian':
-        return syllabize_russian_word(word, separator)
-    elif language == 'english' or language == 'other':
-        return syllabize_english_word(word, separator)
-        
+ROMAJI_SYLLABLE_RE = re.compile(
+    r'^(?:(?:ch|sh|ts|[bcdfghjklmnpqrstvwxyz]y)[aeiou]|(?:ch|sh|ts|[bcdfghjklmnpqrstvwxyz])[aeiouy]|[aeiouy])',
+    re.IGNORECASE)
+ROMAJI_VOWEL_RE = re.compile(r'[aeiouy]', re.IGNORECASE)
+ROMAJI_CONSONANT_RE = re.compile(r'[bcdfghjklmpqrstvwxyz]', re.IGNORECASE)
+
+def split_romaji(word):
+    """Splits a romanized Japanese word into syllables by matching consonant-vowel patterns"""
     syllables = []
     i = 0
     n = len(word)
@@ -435,8 +1347,7 @@ def syllabize_word(word, separator="+", language="japanese"):
     while i < n:
         remaining = word[i:]
         
-        core_pattern = r'^(?:(?:ch|sh|ts|[bcdfghjklmnpqrstvwxyz]y)[aeiou]|(?:ch|sh|ts|[bcdfghjklmnpqrstvwxyz])[aeiouy]|[aeiouy])'
-        match = re.match(core_pattern, remaining, re.IGNORECASE)
+        match = ROMAJI_SYLLABLE_RE.match(remaining)
         
         if not match:
             syllables.append(remaining[0])
@@ -452,12 +1363,12 @@ def syllabize_word(word, separator="+", language="japanese"):
                 is_onset = False
                 if i + 1 < n:
                     after_n = word[i+1]
-                    if re.match(r'[aeiouy]', after_n, re.IGNORECASE):
+                    if ROMAJI_VOWEL_RE.match(after_n):
                         is_onset = True
                 if not is_onset:
                     current_syllable += next_char
                     i += 1
-            elif re.match(r'[bcdfghjklmpqrstvwxyz]', next_char, re.IGNORECASE):
+            elif ROMAJI_CONSONANT_RE.match(next_char):
                 if i + 1 < n:
                     after_c = word[i+1]
                     if next_char.lower() == after_c.lower() or (next_char.lower() == 't' and after_c.lower() == 'c'):
@@ -466,10 +1377,34 @@ def syllabize_word(word, separator="+", language="japanese"):
         
         syllables.append(current_syllable)
         
+    return syllables
+
+def syllabize_word(word, separator="+", language="japanese", english_dict=None):
+    if language == 'russian':
+        return syllabize_russian_word(word, separator)
+    elif language == 'english' or language == 'other':
+        return syllabize_english_word(word, separator, english_dict)
+
+    # Kana are split into morae; kanji and anything else go through the romaji patterns
+    syllables = []
+    for kana_run, chars in itertools.groupby(word, kana.KANA.__contains__):
+        run = ''.join(chars)
+        syllables.extend(kana.syllables(run) if kana_run else split_romaji(run))
     return separator.join(syllables)
 
 def process_line(line, separator="+", romanize=False, capitalize=False, language_override=None):
-    match = re.match(r'^(\[.*?\])(.*)', line)
+    return current_engine().process_line(line, separator=separator, romanize=romanize,
+                                         capitalize=capitalize, language_override=language_override)
+
+def map_lines(lines, separator="+", romanize=False, capitalize=False, language_override=None):
+    """process_line over lines, looking up the dictionary and romanizers once for all of them"""
+    return current_engine().map_lines(lines, separator=separator, romanize=romanize,
+                                      capitalize=capitalize, language_override=language_override)
+
+def _process_line(line, tables, separator="+", romanize=False, capitalize=False, language_override=None):
+    """process_line with the EngineResources.line_tables to use"""
+    english_dict, kks, translit = tables
+    match = LRC_LINE_RE.match(line)
     if not match:
         return line 
     
@@ -479,14 +1414,12 @@ def process_line(line, separator="+", romanize=False, capitalize=False, language
     lang = language_override if language_override else detect_language(text)
     
     if lang == 'japanese' and romanize and kks:
-        result = kks.convert(text)
-        romanized_text = ""
-        for item in result:
-            romanized_text += item['hepburn'] + " " 
-        text = romanized_text.strip()
-        text = re.sub(r'\s+', ' ', text)
+        words = romanize_japanese_words(text, kks)
+        if capitalize and words:
+            words[0][0] = words[0][0][0].upper() + words[0][0][1:]
+        return ' '.join(separator.join(word) for word in words)
         
-    elif lang == 'russian' and romanize and HAS_TRANSLITERATE:
+    elif lang == 'russian' and romanize and translit:
         pass 
 
     if capitalize:
@@ -504,33 +1437,216 @@ def process_line(line, separator="+", romanize=False, capitalize=False, language
             
         if lang == 'russian':
             syll = syllabize_russian_word(word, separator)
-            if romanize and HAS_TRANSLITERATE:
+            if romanize and translit:
                 syll = translit(syll, 'ru', reversed=True)
             syllabized_words.append(syll)
         else:
             # Use detected language, defaulting to japanese logic if it was detected as japanese, 
             # otherwise use the detected lang (which might be 'other' -> english)
-            syllabized_words.append(syllabize_word(word, separator, language=lang))
+            syllabized_words.append(syllabize_word(word, separator, lang, english_dict))
         
     return ' '.join(syllabized_words)
 
+# Options a LyridanEngine holds, with their defaults
+ENGINE_OPTIONS = {
+    # process_line
+    'separator': '+',
+    'romanize': False,
+    'capitalize': False,
+    'language_override': None,
+    # export_rocksmith_xml
+    'offset': 10.0,
+    'empty_measure': False,
+}
+LINE_OPTIONS = ('separator', 'romanize', 'capitalize', 'language_override')
+
+class LyridanEngine:
+    """
+    Processes lyrics with one set of resources (see EngineResources), options and
+    result cache. Engines are cheap: clone() makes one with different options that
+    shares the loaded resources, so a service can keep a warmed engine per configuration.
+    An engine on different resources (say, another dictionary) runs side by side with
+    the default one:
+
+        engine = LyridanEngine(EngineResources('custom.txt'), romanize=True)
+        engine.warm_up()
+        lines = engine.process_lines(lines)
+
+    While one of its methods runs, the module functions (syllabize_word,
+    get_english_dict, ...) use the engine's resources; active() does the same for a block.
+    """
+    def __init__(self, resources=None, result_cache=None, **options):
+        unknown = set(options) - set(ENGINE_OPTIONS)
+        if unknown:
+            raise TypeError(f"Unknown engine options: {', '.join(sorted(unknown))}")
+        self.resources = resources if resources is not None else default_resources()
+        self.result_cache = result_cache
+        self.options = dict(ENGINE_OPTIONS, **options)
+        self.line_options = {key: self.options[key] for key in LINE_OPTIONS}
+
+    def clone(self, **options):
+        """A new engine with options changed, sharing this engine's resources and result cache"""
+        return LyridanEngine(self.resources, self.result_cache, **dict(self.options, **options))
+
+    @contextlib.contextmanager
+    def active(self):
+        """Makes the module functions in this thread use this engine's resources within the block"""
+        token = _active_engine.set(self)
+        try:
+            yield self
+        finally:
+            _active_engine.reset(token)
+
+    def call(self, func, *args, **kwargs):
+        """Returns func(*args, **kwargs), run with this engine active"""
+        token = _active_engine.set(self)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _active_engine.reset(token)
+
+    def warm_up(self):
+        """Loads the resources now instead of on first use"""
+        self.resources.warm_up()
+
+    def set_project_dir(self, project_dir):
+        """See set_project_dir; the setting is per thread and shared by engines on the same resources"""
+        self.resources.dictionaries().set_project_dir(project_dir)
+
+    def _pool(self, pool):
+        # Worker processes load the default resources, so other engines compute in process
+        return pool if self.resources is _default_resources else None
+
+    def process_line(self, line, **options):
+        """Syllabizes one LRC line; options override the engine's process_line options for this call"""
+        options = dict(self.line_options, **options) if options else self.line_options
+        return _process_line(line, self.resources.line_tables(options['romanize']), **options)
+
+    def map_lines(self, lines, **options):
+        """
+        process_line over lines in this thread, without the result cache. The dictionary
+        and romanizers are looked up once for the whole batch.
+        """
+        options = dict(self.line_options, **options) if options else self.line_options
+        tables = self.resources.line_tables(options['romanize'])
+        return [_process_line(line, tables, **options) for line in lines]
+
+    def process_lines(self, lines, pool=None):
+        """
+        Syllabizes LRC lines through the engine's result cache (see cache.process_lines),
+        on pool if it is given and the engine uses the default resources.
+        """
+        import cache
+        return self.call(cache.process_lines, list(lines), self.result_cache, pool=self._pool(pool), **self.line_options)
+
+    def process_file(self, input_file, output_file, pool=None):
+        """Syllabizes one .lrc file into output_file (see workers.process_file)"""
+        import workers
+        self.call(workers.process_file, input_file, output_file, self.result_cache, self._pool(pool), **self.line_options)
+
+    def romanize_spans(self, data):
+        """romanize_line_spans over every line of extract_ttml_data spans, one text per span"""
+        with self.active():
+            romanized = []
+            for line_id, spans in iter_ttml_lines(data):
+                romanized.extend(romanize_line_spans(spans))
+            return romanized
+
+    def export_rocksmith(self, data, output_path, beatmap_path=None, stages=None, **options):
+        """
+        Exports syllabized lyrics to Rocksmith XML, see export_rocksmith_xml. options
+        override the engine's offset and empty_measure for this call.
+        """
+        options = dict(self.options, **options)
+        with self.active():
+            beats = parse_rocksmith_beatmap(beatmap_path) if beatmap_path else []
+            if stages is None:
+                stages = rocksmith_stages(options['offset'], beats, options['empty_measure'])
+            count = len(data) if hasattr(data, '__len__') else None
+            try:
+                write_rocksmith_vocals(run_stages(data, stages), output_path, count)
+                return True
+            except Exception as e:
+                print(f"Error writing XML: {e}")
+                return False
+
 def main():
-    input_file = 'test.lrc'
-    output_file = 'output.txt'
+    import argparse
+    import cache
+    import workers
+    from config import Config
+    
+    parser = argparse.ArgumentParser(description="Syllabize and romanize .lrc files.")
+    parser.add_argument('inputs', nargs='*', default=['test.lrc'], help=".lrc files to process")
+    parser.add_argument('-o', '--output', help="output file (single input only, default: output.txt)")
+    parser.add_argument('-s', '--separator', default='+', help="syllable separator")
+    parser.add_argument('-r', '--romanize', action='store_true', help="romanize/transliterate Japanese and Russian")
+    parser.add_argument('-c', '--capitalize', action='store_true', help="capitalize the first word of each line")
+    parser.add_argument('-l', '--language', choices=['japanese', 'russian', 'english'], help="skip language detection")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the result cache")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="worker processes to use (0 = one per core)")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream each file through the workers in chunks instead of loading it whole (for very large files)")
+    parser.add_argument('--chunk-size', type=int, help="lines per worker task when streaming (default: workers.chunk_size)")
+    parser.add_argument('--window', type=int,
+                        help="chunks in flight at once when streaming, which bounds memory (default: workers.window, 0 = 4 per worker)")
+    args = parser.parse_args()
+    
+    if args.output and len(args.inputs) > 1:
+        parser.error("--output can only be used with a single input file")
+    if args.stream and args.jobs == 1:
+        parser.error("--stream needs worker processes, use -j 0 or -j N")
+    
+    config = Config()
+    options = {'separator': args.separator, 'romanize': args.romanize,
+               'capitalize': args.capitalize, 'language_override': args.language}
+    
+    jobs = []
+    for input_file in args.inputs:
+        if len(args.inputs) == 1:
+            output_file = args.output or 'output.txt'
+        else:
+            base = os.path.splitext(input_file)[0]
+            output_file = f"{base} Syllabized.txt"
+        jobs.append((input_file, output_file))
+    
+    pool = None
+    if args.jobs != 1:
+        pool = workers.WorkerPool(args.jobs or None, config.get('workers.max_tasks_per_child', 100))
     
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            
-        processed_lines = [process_line(line.strip()) for line in lines]
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(processed_lines))
-            
-        print(f"Successfully processed {input_file} to {output_file}")
-        
-    except Exception as e:
-        print(f"Error: {e}")
+        if args.stream:
+            # Each file split into chunks across the workers, written out as the chunks finish
+            chunk_size = args.chunk_size or config.get('workers.chunk_size', workers.CHUNK_SIZE)
+            window = args.window if args.window is not None else config.get('workers.window', 0)
+            for input_file, output_file in jobs:
+                try:
+                    count = workers.process_large_file(input_file, output_file, pool, not args.no_cache,
+                                                       chunk_size, window, **options)
+                    print(f"Successfully processed {count} lines of {input_file} to {output_file}")
+                except Exception as e:
+                    print(f"Error: {e}")
+        elif pool is not None and len(jobs) > 1:
+            # Many files: one file per worker task
+            for input_file, output_file, error in pool.process_files(jobs, use_cache=not args.no_cache, **options):
+                if error:
+                    print(f"Error: {error}")
+                else:
+                    print(f"Successfully processed {input_file} to {output_file}")
+        else:
+            # One file at a time, its lines split across the workers if there are any
+            result_cache = None if args.no_cache else cache.open_default_cache(config)
+            for input_file, output_file in jobs:
+                try:
+                    workers.process_file(input_file, output_file, result_cache, pool, **options)
+                    print(f"Successfully processed {input_file} to {output_file}")
+                except Exception as e:
+                    print(f"Error: {e}")
+    finally:
+        if pool is not None:
+            pool.close()
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
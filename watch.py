@@ -0,0 +1,348 @@
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+import cache
+import exporters
+import syllabize
+import workers
+from config import Config
+
+WATCHED_EXTENSIONS = ('.lrc', '.ttml', '.ttmf')
+# Seconds a file must go without further writes before it is processed
+DEBOUNCE = 2.0
+# Seconds between directory scans when inotify is not available
+POLL_INTERVAL = 2.0
+# Longest a wait blocks, so stop() is noticed promptly
+MAX_WAIT = 0.5
+
+# inotify(7) event flags
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+def is_watched(path):
+    name = os.path.basename(path)
+    return name.lower().endswith(WATCHED_EXTENSIONS) and not name.startswith(('.', '~'))
+
+def output_path(path):
+    """Where the result for a watched file goes: beside it, named like the CLI names batch outputs"""
+    base = os.path.splitext(path)[0]
+    if path.lower().endswith('.lrc'):
+        return f"{base} Syllabized.txt"
+    return f"{base}_rs.xml"
+
+def scan_folders(folders):
+    """Returns {path: (mtime, size)} for every watched file directly inside folders"""
+    stamps = {}
+    for folder in folders:
+        try:
+            entries = list(os.scandir(folder))
+        except OSError as e:
+            print(f"Warning: Could not scan {folder}: {e}")
+            continue
+        for entry in entries:
+            if is_watched(entry.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                stamps[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+class InotifySource:
+    """Change notifications from the Linux kernel through inotify, via ctypes"""
+    def __init__(self, folders):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = {}
+        try:
+            for folder in folders:
+                wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), INOTIFY_MASK)
+                if wd < 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, f"Could not watch {folder}: {os.strerror(errno)}")
+                self.folders[wd] = folder
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def wait(self, timeout):
+        """Returns the paths changed within timeout seconds (possibly none)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, pos)
+            pos += INOTIFY_EVENT.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; treat every file as possibly changed
+                paths.extend(scan_folders(self.folders.values()))
+            elif name and wd in self.folders:
+                path = os.path.join(self.folders[wd], os.fsdecode(name))
+                if is_watched(path):
+                    paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingSource:
+    """Finds changes by rescanning the folders every interval seconds"""
+    def __init__(self, folders, interval=POLL_INTERVAL):
+        self.folders = list(folders)
+        self.interval = interval
+        self.stamps = scan_folders(self.folders)
+        self.next_scan = time.monotonic() + interval
+
+    def wait(self, timeout):
+        delay = self.next_scan - time.monotonic()
+        if timeout is not None and timeout < delay:
+            time.sleep(max(0.0, timeout))
+            return []
+        time.sleep(max(0.0, delay))
+        self.next_scan = time.monotonic() + self.interval
+        stamps = scan_folders(self.folders)
+        changed = [path for path, stamp in stamps.items() if self.stamps.get(path) != stamp]
+        self.stamps = stamps
+        return changed
+
+    def close(self):
+        pass
+
+def open_source(folders, poll_interval=POLL_INTERVAL, use_inotify=True):
+    """inotify where the platform has it, polling everywhere else"""
+    if use_inotify and sys.platform.startswith('linux'):
+        try:
+            return InotifySource(folders)
+        except OSError as e:
+            print(f"Warning: {e}; falling back to polling")
+    return PollingSource(folders, poll_interval)
+
+class WatchProcessor:
+    """
+    Turns a watched file into its output, skipping files whose content (and the options
+    used) hashes the same as the last time they were processed. The hashes are kept in
+    state_path, so files that did not change while nothing was watching are skipped too.
+    """
+    def __init__(self, options, state_path=None, result_cache=None, offset=10.0):
+        self.options = options
+        self.offset = offset
+        self.result_cache = result_cache
+        self.state_path = state_path
+        # Loaded on first use, after any earlier watcher has finished writing it
+        self.state = None
+        self.options_id = json.dumps([options, offset], sort_keys=True)
+
+    def load_state(self):
+        self.state = {}
+        if self.state_path and os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except Exception as e:
+                print(f"Warning: Could not load watch state: {e}")
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        try:
+            # Replaced in one step, so a crash mid-write can't leave the state truncated
+            with exporters.atomic_open(self.state_path) as f:
+                json.dump(self.state, f)
+        except Exception as e:
+            print(f"Warning: Could not save watch state: {e}")
+
+    def process(self, path):
+        """Processes path if it changed; returns the output path written, or None"""
+        if self.state is None:
+            self.load_state()
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Deleted or renamed away before it settled
+            if self.state.pop(path, None) is not None:
+                self.save_state()
+            return None
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        output = output_path(path)
+        saved = self.state.get(path)
+        if saved and (saved['options'] != self.options_id or not os.path.exists(output)):
+            saved = None
+        if saved and saved['stamp'] == stamp:
+            return None
+
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if saved and saved['hash'] == digest:
+            # Touched or rewritten with the same content
+            saved['stamp'] = stamp
+            self.save_state()
+            return None
+
+        if path.lower().endswith('.lrc'):
+            workers.process_file(path, output, self.result_cache, **self.options)
+        else:
+            data = syllabize.extract_ttml_data(path)
+            if not data:
+                raise ValueError(f"No lyrics found in {path}")
+            if not syllabize.export_rocksmith_xml(data, output, offset=self.offset):
+                raise ValueError(f"Could not write {output}")
+        self.state[path] = {'stamp': stamp, 'hash': digest, 'options': self.options_id}
+        self.save_state()
+        return output
+
+class FolderWatcher:
+    """
+    Watches folders and hands each new or changed file to processor once writes to it
+    have stopped for debounce seconds. Files already in the folders are checked on start.
+    """
+    def __init__(self, folders, processor, debounce=DEBOUNCE, poll_interval=POLL_INTERVAL, use_inotify=True):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.processor = processor
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def handle(self, path):
+        try:
+            output = self.processor.process(path)
+            if output:
+                print(f"Processed {path} -> {output}")
+        except Exception as e:
+            print(f"Error processing {path}: {e}")
+
+    def check_existing(self):
+        """Processes every file in the folders that changed since it was last processed"""
+        for path in sorted(scan_folders(self.folders)):
+            self.handle(path)
+
+    def run(self):
+        """Watches until stop() is called"""
+        source = open_source(self.folders, self.poll_interval, self.use_inotify)
+        try:
+            self.check_existing()
+            # path -> time of its latest change
+            pending = {}
+            while not self.stop_event.is_set():
+                timeout = MAX_WAIT
+                if pending:
+                    timeout = min(timeout, max(0.0, min(pending.values()) + self.debounce - time.monotonic()))
+                changed = source.wait(timeout)
+                now = time.monotonic()
+                for path in changed:
+                    pending[path] = now
+                for path, changed_at in sorted(pending.items()):
+                    if now - changed_at >= self.debounce:
+                        del pending[path]
+                        self.handle(path)
+        finally:
+            source.close()
+
+    def start(self, after=None):
+        """
+        Runs the watcher on a background thread. after is a thread returned by another
+        watcher's stop(wait=False): watching begins once it has finished, so two watchers
+        never process files (or write the watch state) at the same time.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            raise RuntimeError("The watcher is already running")
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run_after, args=(after,), daemon=True)
+        self.thread.start()
+
+    def _run_after(self, after):
+        if after is not None:
+            after.join()
+        if not self.stop_event.is_set():
+            self.run()
+
+    def stop(self, wait=True):
+        """
+        Stops watching; with wait, also waits for a file being processed to finish.
+        Without wait, returns the thread that may still be finishing, for start(after=...).
+        """
+        self.stop_event.set()
+        thread, self.thread = self.thread, None
+        if thread is not None and wait:
+            thread.join()
+        return None if wait else thread
+
+def watcher_from_config(config, folders=None, result_cache=None):
+    """A FolderWatcher for the watch settings in config (and the given folders, if any)"""
+    options = {'separator': config.get('watch.separator', '+'),
+               'romanize': config.get('watch.romanize', False),
+               'capitalize': config.get('watch.capitalize', False),
+               'language_override': None}
+    processor = WatchProcessor(options, os.path.join(config.config_dir, 'watch_state.json'), result_cache,
+                               config.get('watch.rocksmith_offset', 10.0))
+    return FolderWatcher(folders if folders is not None else config.get('watch.folders', []), processor,
+                         config.get('watch.debounce', DEBOUNCE), config.get('watch.poll_interval', POLL_INTERVAL))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watch folders and syllabize .lrc files (or export .ttml files to Rocksmith XML) as they arrive.")
+    parser.add_argument('folders', nargs='*', help="folders to watch (default: watch.folders in the config)")
+    parser.add_argument('-s', '--separator', help="syllable separator")
+    parser.add_argument('-r', '--romanize', action='store_true', default=None, help="romanize/transliterate Japanese and Russian")
+    parser.add_argument('-c', '--capitalize', action='store_true', default=None, help="capitalize the first word of each line")
+    parser.add_argument('--offset', type=float, help="Rocksmith time offset in seconds")
+    parser.add_argument('--debounce', type=float, help="seconds a file must be left alone before it is processed")
+    parser.add_argument('--poll', action='store_true', help="scan the folders instead of using inotify")
+    parser.add_argument('--once', action='store_true', help="process new and changed files, then exit")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the result cache")
+    args = parser.parse_args()
+
+    config = Config()
+    # Command line options apply to this run only
+    for key, value in (('separator', args.separator), ('romanize', args.romanize), ('capitalize', args.capitalize),
+                       ('rocksmith_offset', args.offset), ('debounce', args.debounce)):
+        if value is not None:
+            config.settings['watch'][key] = value
+    folders = args.folders or config.get('watch.folders', [])
+    if not folders:
+        parser.error("no folders given and watch.folders is empty")
+    for folder in folders:
+        if not os.path.isdir(folder):
+            parser.error(f"not a folder: {folder}")
+
+    result_cache = None if args.no_cache else cache.open_default_cache(config)
+    watcher = watcher_from_config(config, folders, result_cache)
+    watcher.use_inotify = not args.poll
+    if args.once:
+        watcher.check_existing()
+        return
+    print(f"Watching {', '.join(watcher.folders)} (Ctrl+C to stop)")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import atexit
+import gc
+import itertools
+import multiprocessing
+import os
+from collections import deque
+
+import cache
+import syllabize
+
+# Lines sent to a worker per task when a single file is split up
+CHUNK_SIZE = 500
+# Chunks read ahead per worker process when streaming a file (see WorkerPool.imap_stream)
+WINDOW_PER_PROCESS = 4
+
+_shared_pool = None
+_worker_cache = None
+
+def share_tables():
+    """
+    Prepares the read-only lookup tables once, in this process, before workers start.
+    The English dictionary index is compiled here and every worker memory-maps the same
+    file (see EngineResources.use_index). Where workers are forked, pykakasi's dictionaries are loaded here too and frozen
+    out of the garbage collector, so the workers share those pages instead of each
+    loading (and the collector touching) a copy of their own.
+    Returns True if objects were frozen; the caller unfreezes them (see thaw_tables) once
+    the workers have forked, so a long-lived parent such as the GUI still collects them.
+    """
+    syllabize.default_resources().compile_index()
+    if multiprocessing.get_start_method() == 'fork':
+        syllabize.warm_up()
+        gc.collect()
+        gc.freeze()
+        return True
+    return False
+
+def thaw_tables():
+    """Returns what share_tables froze to the garbage collector, in this (parent) process"""
+    gc.unfreeze()
+
+def _init_worker():
+    """Runs once in every worker process, before its first task"""
+    if multiprocessing.get_start_method() == 'fork':
+        # Keep this worker's collector off the pages inherited from the parent, including
+        # in workers forked to replace retired ones after the parent has thawed
+        gc.freeze()
+    syllabize.default_resources().use_index()
+    syllabize.warm_up()
+
+def _get_worker_cache():
+    global _worker_cache
+    if _worker_cache is None:
+        from config import Config
+        _worker_cache = cache.open_default_cache(Config())
+    return _worker_cache
+
+def _process_chunk(task):
+    lines, options, project_dir, use_cache = task
+    if project_dir != syllabize.get_project_dir():
+        syllabize.set_project_dir(project_dir)
+    if use_cache:
+        return cache.process_lines(lines, _get_worker_cache(), **options)
+    return syllabize.map_lines(lines, **options)
+
+def _process_file_task(task):
+    input_file, output_file, options, use_cache = task
+    try:
+        process_file(input_file, output_file, _get_worker_cache() if use_cache else None, **options)
+        return input_file, output_file, None
+    except Exception as e:
+        return input_file, output_file, str(e)
+
+def process_file(input_file, output_file, result_cache=None, pool=None, **options):
+    """Syllabizes one .lrc file into output_file, using the cache and pool if given"""
+    # Words in a lyridan_dictionary.txt next to the file override the other dictionaries
+    syllabize.set_project_dir(os.path.dirname(os.path.abspath(input_file)))
+    lines, info = syllabize.read_lrc_file(input_file)
+    lines = [line.strip() for line in lines]
+    processed_lines = cache.process_lines(lines, result_cache, pool=pool, **options)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(processed_lines))
+
+def process_large_file(input_file, output_file, pool, use_cache=True, chunk_size=CHUNK_SIZE, window=None, **options):
+    """
+    Syllabizes a single .lrc file too large to hold in memory, such as a dump of many songs.
+    Lines are read as a stream, processed in chunks on the pool and written to output_file
+    in their original order as soon as each chunk is done; at most window chunks are held
+    at any time. Returns the number of lines written.
+    """
+    syllabize.set_project_dir(os.path.dirname(os.path.abspath(input_file)))
+    lines = (line.strip() for line in syllabize.iter_lrc_lines(input_file))
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for line in pool.imap_stream(lines, chunk_size, window, use_cache, **options):
+            f.write('\n' + line if count else line)
+            count += 1
+    return count
+
+class WorkerPool:
+    """
+    Pool of worker processes that share the read-only lookup tables (see share_tables).
+    Workers are replaced after max_tasks tasks to cap memory growth, and results
+    always come back in the order the work was submitted.
+    """
+    def __init__(self, processes=None, max_tasks=100):
+        self.processes = processes or os.cpu_count() or 1
+        frozen = share_tables()
+        try:
+            self.pool = multiprocessing.Pool(self.processes, initializer=_init_worker, maxtasksperchild=max_tasks or None)
+        finally:
+            if frozen:
+                thaw_tables()
+
+    def imap_lines(self, lines, chunk_size=CHUNK_SIZE, **options):
+        """Yields processed lines in order while later chunks are still being worked on"""
+        # Workers use the same project dictionary as this process
+        project_dir = syllabize.get_project_dir()
+        tasks = ((lines[i:i + chunk_size], options, project_dir, False) for i in range(0, len(lines), chunk_size))
+        for chunk in self.pool.imap(_process_chunk, tasks):
+            yield from chunk
+
+    def imap_stream(self, lines, chunk_size=CHUNK_SIZE, window=None, use_cache=False, **options):
+        """
+        Like imap_lines for an iterable of any length, read lazily: at most window chunks
+        (default WINDOW_PER_PROCESS per worker) are queued or waiting to be yielded, so
+        memory stays bounded however long the input is. With use_cache, workers look lines
+        up in (and add them to) the result cache.
+        """
+        window = max(1, window or WINDOW_PER_PROCESS * self.processes)
+        project_dir = syllabize.get_project_dir()
+        lines = iter(lines)
+        in_flight = deque()
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if chunk:
+                in_flight.append(self.pool.apply_async(_process_chunk, ((chunk, options, project_dir, use_cache),)))
+            if in_flight and (len(in_flight) >= window or not chunk):
+                yield from in_flight.popleft().get()
+            elif not chunk:
+                return
+
+    def map_lines(self, lines, chunk_size=CHUNK_SIZE, **options):
+        lines = list(lines)
+        # Smaller chunks for short inputs so every worker gets a share
+        chunk_size = max(1, min(chunk_size, -(-len(lines) // self.processes)))
+        return list(self.imap_lines(lines, chunk_size, **options))
+
+    def process_files(self, jobs, use_cache=True, **options):
+        """
+        Processes (input_file, output_file) pairs, one file per task.
+        Yields (input_file, output_file, error) in submission order; error is None on success.
+        """
+        tasks = ((input_file, output_file, options, use_cache) for input_file, output_file in jobs)
+        yield from self.pool.imap(_process_file_task, tasks)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def get_pool(config=None):
+    """Returns the shared pool, starting it on first use so later batches find it warm"""
+    global _shared_pool
+    if _shared_pool is None:
+        processes = config.get('workers.processes', 0) if config else 0
+        max_tasks = config.get('workers.max_tasks_per_child', 100) if config else 100
+        _shared_pool = WorkerPool(processes or None, max_tasks)
+    return _shared_pool
+
+def shutdown_pool():
+    global _shared_pool
+    if _shared_pool is not None:
+        _shared_pool.terminate()
+        _shared_pool = None
+
+atexit.register(shutdown_pool)